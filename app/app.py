@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
-from typing import Any, Tuple, Union
+from typing import Any, Iterator, Optional, Tuple, Union
 import os
+import queue
+import uuid
 from flask import (
     Flask,
     render_template,
@@ -10,11 +12,39 @@ from flask import (
     Response,
     stream_with_context,
 )
+from werkzeug.middleware.proxy_fix import ProxyFix
 
-from downloader import download_video
+from downloader import download_video, Downloader
+from exceptions import (
+    AudioStreamUnavailableError,
+    JobCancelledError,
+    JobTimeoutError,
+)
+from cancellation import CancelToken, cancellation_registry
+from profiling import profiler
+from video_utils import is_valid_video_url, clean_video_url
 from file_utils import create_ascii_filename, create_content_disposition_header
 from progress import progress_stream as progress_channel
 from job_status import job_status_store
+from media_store import MediaStore
+from scheduler import (
+    JobScheduler,
+    Ticket,
+    estimate_job_cost,
+    DEFAULT_MAX_CONCURRENT_JOBS,
+)
+from janitor import (
+    DownloadJanitor,
+    DEFAULT_QUOTA_BYTES,
+    DEFAULT_MAX_AGE_SECONDS,
+    DEFAULT_INTERVAL_SECONDS,
+)
+
+# Reverse proxies in front of the app whose X-Forwarded-For is trusted (0 = none)
+DEFAULT_TRUSTED_PROXY_COUNT: int = 0
+# SSE comment interval; writing it is how a closed /progress client is noticed
+PROGRESS_HEARTBEAT_SECONDS: float = 5.0
+FINISHED_JOB_STATUSES = ("not_found", "completed", "error", "cancelled")
 
 
 class App:
@@ -25,6 +55,9 @@ class App:
     download_dir: str
     host: str
     port: int
+    media_store: MediaStore
+    janitor: DownloadJanitor
+    scheduler: JobScheduler
 
     def __init__(self) -> None:
         self.flask_app = Flask(__name__)
@@ -39,15 +72,53 @@ class App:
 
         os.makedirs(self.download_dir, exist_ok=True)
 
+        # Only behind a known proxy may X-Forwarded-For replace the peer address
+        trusted_proxies = int(
+            os.getenv("TRUSTED_PROXY_COUNT", DEFAULT_TRUSTED_PROXY_COUNT)
+        )
+        if trusted_proxies > 0:
+            self.flask_app.wsgi_app = ProxyFix(  # type: ignore[method-assign]
+                self.flask_app.wsgi_app, x_for=trusted_proxies
+            )
+
+        self.media_store = MediaStore(self.download_dir)
+
+        # The janitor works on stored objects; evicting one also forgets its media keys
+        self.janitor = DownloadJanitor(
+            self.media_store.objects_dir,
+            quota_bytes=int(os.getenv("DOWNLOAD_QUOTA_BYTES", DEFAULT_QUOTA_BYTES)),
+            max_age_seconds=int(
+                os.getenv("DOWNLOAD_MAX_AGE_SECONDS", DEFAULT_MAX_AGE_SECONDS)
+            ),
+            interval_seconds=int(
+                os.getenv("JANITOR_INTERVAL_SECONDS", DEFAULT_INTERVAL_SECONDS)
+            ),
+            remove_file=self.media_store.remove_object,
+        )
+        self.janitor.load_existing()
+
+        self.scheduler = JobScheduler(
+            max_concurrent=int(
+                os.getenv("MAX_CONCURRENT_DOWNLOADS", DEFAULT_MAX_CONCURRENT_JOBS)
+            )
+        )
+
         self._setup_routes()
 
     def _setup_routes(self) -> None:
         """Setup Flask routes"""
         self.flask_app.route("/")(self.index)
         self.flask_app.route("/download", methods=["POST"])(self.download)
+        self.flask_app.route("/info")(self.info)
         self.flask_app.route("/health")(self.health)
+        self.flask_app.route("/storage")(self.storage)
+        self.flask_app.route("/queue")(self.queue)
+        self.flask_app.route("/jobs/<job_id>", methods=["DELETE"])(self.cancel_job)
         self.flask_app.route("/jobs/<job_id>/status")(self.job_status)
         self.flask_app.route("/progress")(self.progress_events)
+        self.flask_app.route("/debug/profile", methods=["GET", "DELETE"])(
+            self.debug_profile
+        )
 
     def index(self) -> str:
         """Main page"""
@@ -57,12 +128,19 @@ class App:
         """Create download response"""
         ascii_filename = create_ascii_filename(filename)
 
-        response = send_file(
-            file_path,
-            as_attachment=True,
-            download_name=ascii_filename,
-            mimetype="application/octet-stream",
-        )
+        # Keep the janitor away from the file until the response is fully sent
+        self.janitor.track(file_path, acquire=True)
+        try:
+            response = send_file(
+                file_path,
+                as_attachment=True,
+                download_name=ascii_filename,
+                mimetype="application/octet-stream",
+            )
+        except Exception:
+            self.janitor.release(file_path)
+            raise
+        response.call_on_close(lambda: self.janitor.release(file_path))
 
         # Manually set Content-Disposition header (RFC 5987 compliant)
         # Override Flask's default header to support Japanese filenames properly
@@ -72,12 +150,128 @@ class App:
 
         return response
 
+    def client_id(self) -> str:
+        """Identify the requesting client for fair scheduling"""
+        # Already resolved from X-Forwarded-For when TRUSTED_PROXY_COUNT is set
+        return request.remote_addr or "unknown"
+
+    def acquire_download_slot(
+        self,
+        url: str,
+        format_type: str,
+        session_id: Optional[str],
+        cancel_token: CancelToken,
+    ) -> Ticket:
+        """Wait for a download slot, ordered by estimated cost from preflight metadata"""
+        # Only metadata already extracted by /info is used; no extraction here
+        media_info = None
+        if is_valid_video_url(url):
+            media_info = Downloader().get_cached_media_info(clean_video_url(url))
+        cost = estimate_job_cost(media_info, format_type)
+
+        def on_wait(position: int) -> None:
+            if session_id:
+                message = f"Waiting in queue (position {position})"
+                job_status_store.set_status(session_id, "queued", message)
+                progress_channel.publish(session_id, message)
+
+        cancel_token.enter_phase("queue")
+        return self.scheduler.acquire(
+            self.client_id(),
+            cost,
+            on_wait=on_wait,
+            check_cancelled=cancel_token.raise_if_cancelled,
+        )
+
+    def request_job_cancel(self, job_id: str, reason: str) -> bool:
+        """Cancel a running job here or, through the status store, on another replica"""
+        status = job_status_store.get_status(job_id)
+        if status.get("status") in FINISHED_JOB_STATUSES:
+            return False
+        job_status_store.request_cancel(job_id)
+        cancellation_registry.cancel(job_id, reason)
+        return True
+
+    def report_job_error(self, session_id: Optional[str], error: Exception) -> None:
+        """Record a failed or cancelled job"""
+        msg = str(error)
+        print(msg)
+        if session_id:
+            status = "cancelled" if isinstance(error, JobCancelledError) else "error"
+            job_status_store.set_status(session_id, status, msg)
+            progress_channel.close(session_id)
+
+    def create_streaming_audio_response(
+        self,
+        url: str,
+        session_id: Optional[str],
+        ticket: Ticket,
+        cancel_token: CancelToken,
+    ) -> Optional[Response]:
+        """Create chunked mp3 response transcoded on the fly (None when the source cannot be streamed)
+
+        On success the response takes over the scheduler ticket and the
+        cancellation token and releases both once the stream ends.
+        """
+        try:
+            stream, filename = Downloader().stream_audio(
+                url, session_id=session_id, cancel_token=cancel_token
+            )
+        except AudioStreamUnavailableError as e:
+            print(f"Streaming unavailable, falling back to download: {e}", flush=True)
+            return None
+
+        finished = False
+
+        def body() -> Iterator[bytes]:
+            nonlocal finished
+            try:
+                yield from stream
+            except Exception as e:
+                finished = True
+                # Headers are already sent; abort so the client sees an incomplete transfer
+                self.report_job_error(session_id, e)
+                raise
+            finished = True
+            if session_id:
+                job_status_store.set_status(
+                    session_id, "completed", "ダウンロードが完了しました"
+                )
+
+        def on_close() -> None:
+            if not finished:
+                # Client went away mid-stream (GeneratorExit) or never read the body
+                cancel_token.cancel("client disconnected")
+                try:
+                    cancel_token.raise_if_cancelled()
+                except JobCancelledError as e:
+                    self.report_job_error(session_id, e)
+            stream.close()
+            self.scheduler.release(ticket)
+            cancellation_registry.remove(cancel_token.job_id)
+
+        # No Content-Length: the response goes out with chunked transfer encoding
+        headers = {
+            "Content-Disposition": create_content_disposition_header(
+                filename, create_ascii_filename(filename)
+            ),
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        }
+        response = Response(body(), mimetype="application/octet-stream", headers=headers)
+        # Runs after the last chunk, on client disconnect, or if the body was never read
+        response.call_on_close(on_close)
+        # From here a disconnect shows up as a failed write, which closes the stream
+        cancel_token.client_socket = None
+        return response
+
     def download(self) -> Union[Response, Tuple[Response, int]]:
         """Download processing"""
         try:
             url = request.form.get("url")
             format_type = request.form.get("format")
             session_id = request.form.get("session_id")
+            stream = request.form.get("stream") in ("1", "true", "on")
             print(f"/download: [{format_type}] {url}", flush=True)
 
             if not url or not format_type:
@@ -89,9 +283,38 @@ class App:
                     session_id, "started", "ダウンロードを開始しました"
                 )
                 progress_channel.publish(session_id, "Download started")
-            file_path, filename = download_video(
-                url, format_type, self.download_dir, session_id=session_id
-            )
+
+            cancel_token = cancellation_registry.create(session_id or uuid.uuid4().hex)
+            # Watched by the registry so a closed browser tab stops the job
+            cancel_token.client_socket = request.environ.get("werkzeug.socket")
+            handed_over = False
+            try:
+                ticket = self.acquire_download_slot(
+                    url, format_type, session_id, cancel_token
+                )
+                try:
+                    if format_type == "audio" and stream:
+                        response = self.create_streaming_audio_response(
+                            url, session_id, ticket, cancel_token
+                        )
+                        if response is not None:
+                            handed_over = True
+                            return response
+
+                    file_path, filename = download_video(
+                        url,
+                        format_type,
+                        self.download_dir,
+                        session_id=session_id,
+                        media_store=self.media_store,
+                        cancel_token=cancel_token,
+                    )
+                finally:
+                    if not handed_over:
+                        self.scheduler.release(ticket)
+            finally:
+                if not handed_over:
+                    cancellation_registry.remove(cancel_token.job_id)
             print(f'Save: "{file_path}"')
             if session_id:
                 job_status_store.set_status(
@@ -100,17 +323,51 @@ class App:
 
             # Create response
             return self.create_download_response(file_path, filename)
+        except JobCancelledError as e:
+            self.report_job_error(session_id, e)
+            http_status = 504 if isinstance(e, JobTimeoutError) else 409
+            return jsonify({"error": str(e)}), http_status
+        except Exception as e:
+            self.report_job_error(session_id, e)
+            return jsonify({"error": str(e)}), 500
+
+    def info(self) -> Union[Response, Tuple[Response, int]]:
+        """Preflight metadata (title, duration, resolutions, estimated size)"""
+        url = request.args.get("url")
+        if not url:
+            return jsonify({"error": "URLを指定してください"}), 400
+        if not is_valid_video_url(url):
+            return jsonify({"error": "有効な動画URL（YouTube/Twitter/TikTok）ではありません"}), 400
+
+        try:
+            media_info = Downloader().get_media_info(clean_video_url(url))
         except Exception as e:
             msg = str(e)
             print(msg)
-            if session_id:
-                job_status_store.set_status(session_id, "error", msg)
             return jsonify({"error": msg}), 500
+        return jsonify({"url": url, **media_info})
+
+    def queue(self) -> Response:
+        """Scheduler queue length and wait time statistics"""
+        return jsonify(self.scheduler.stats())
 
     def health(self) -> Response:
         """Health check"""
         return jsonify({"status": "ok"})
 
+    def storage(self) -> Response:
+        """Download directory usage and eviction statistics"""
+        return jsonify(self.janitor.stats())
+
+    def cancel_job(self, job_id: str) -> Tuple[Response, int]:
+        """Cancel a queued or running job"""
+        status = job_status_store.get_status(job_id)
+        if status.get("status") == "not_found":
+            return jsonify({"job_id": job_id, **status}), 404
+        if not self.request_job_cancel(job_id, "cancelled by user"):
+            return jsonify({"job_id": job_id, "error": "ジョブは既に終了しています"}), 409
+        return jsonify({"job_id": job_id, "status": "cancelling"}), 202
+
     def job_status(self, job_id: str) -> Tuple[Response, int]:
         """Get job status"""
         status = job_status_store.get_status(job_id)
@@ -125,15 +382,30 @@ class App:
 
         def event_stream() -> Any:
             listener = progress_channel.register(session_id)
+            finished = False
             try:
                 while True:
-                    message = listener.get()
+                    if profiler.enabled:
+                        # Messages waiting for this client (in-memory listeners only)
+                        qsize = getattr(listener, "qsize", None)
+                        if qsize is not None:
+                            profiler.observe("progress_events.backlog", qsize())
+                    try:
+                        with profiler.timer("progress_events.wait"):
+                            message = listener.get(timeout=PROGRESS_HEARTBEAT_SECONDS)
+                    except queue.Empty:
+                        yield ": keepalive\n\n"
+                        continue
                     if message is None:
+                        finished = True
                         yield "event: complete\ndata: done\n\n"
                         break
                     yield f"event: progress\ndata: {message}\n\n"
             finally:
                 progress_channel.unregister(session_id, listener)
+                if not finished:
+                    # Client closed the page before the job ended
+                    self.request_job_cancel(session_id, "progress client disconnected")
 
         headers = {
             "Cache-Control": "no-cache",
@@ -146,8 +418,17 @@ class App:
             headers=headers,
         )
 
+    def debug_profile(self) -> Union[Response, Tuple[Response, int]]:
+        """Profiling report (enable with PROFILING=1); DELETE resets it"""
+        if not profiler.enabled:
+            return jsonify({"error": "プロファイリングは無効です (PROFILING=1)"}), 404
+        if request.method == "DELETE":
+            profiler.reset()
+        return jsonify(profiler.report())
+
     def run(self) -> None:
         """Run the application"""
+        self.janitor.start()
         self.flask_app.run(host=self.host, port=self.port, debug=False)
 
 
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""Micro-benchmarks for ProgressStream and JobStatusStore.
+
+Measures throughput, per-call latency, lock wait/hold times and listener
+queue growth at a range of concurrent session counts. Reports are JSON so
+runs from different versions can be compared:
+
+    python3 bench_stores.py --output before.json
+    python3 bench_stores.py --output after.json --compare before.json
+
+Reports carry the git revision of the checkout the script lives in, or
+the value of --label (or BENCH_LABEL) where there is no checkout, as
+inside the container.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from job_status import JobStatusStore, SqliteJobStatusStore
+from profiling import percentile
+from progress import ProgressStream, SqliteProgressStream
+
+DEFAULT_SESSION_COUNTS: str = "1000,10000"
+DEFAULT_EVENTS_PER_SESSION: int = 20
+DEFAULT_THREADS: int = 8
+
+
+class TimedLock:
+    """Drop-in replacement for a store's lock that records wait and hold times."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._acquired_at = 0.0
+        self.waits: List[float] = []
+        self.holds: List[float] = []
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        requested_at = time.perf_counter()
+        acquired = self._lock.acquire(blocking, timeout)
+        if acquired:
+            self._acquired_at = time.perf_counter()
+            self.waits.append(self._acquired_at - requested_at)
+        return acquired
+
+    def release(self) -> None:
+        # Still held here, so appending is serialized by the lock itself
+        self.holds.append(time.perf_counter() - self._acquired_at)
+        self._lock.release()
+
+    def __enter__(self) -> bool:
+        return self.acquire()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.release()
+
+
+def summarize(values: List[float]) -> Dict[str, Optional[float]]:
+    """Percentiles in microseconds."""
+    if not values:
+        return {"count": 0, "p50_us": None, "p99_us": None, "max_us": None}
+    ordered = sorted(values)
+
+    def at(fraction: float) -> Optional[float]:
+        value = percentile(ordered, fraction)
+        return round(value * 1e6, 2) if value is not None else None
+
+    return {
+        "count": len(ordered),
+        "p50_us": at(0.5),
+        "p99_us": at(0.99),
+        "max_us": round(ordered[-1] * 1e6, 2),
+    }
+
+
+def run_threads(
+    work: Callable[[List[str], List[float]], None], sessions: List[str], threads: int
+) -> Tuple[float, List[float]]:
+    """Split sessions over threads; return wall time and per-call latencies."""
+    latencies: List[List[float]] = [[] for _ in range(threads)]
+    workers = [
+        threading.Thread(target=work, args=(sessions[i::threads], latencies[i]))
+        for i in range(threads)
+    ]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    return elapsed, [value for chunk in latencies for value in chunk]
+
+
+def operation_result(
+    elapsed: float, latencies: List[float], lock: Optional[TimedLock]
+) -> Dict[str, Any]:
+    result: Dict[str, Any] = {
+        "ops": len(latencies),
+        "seconds": round(elapsed, 4),
+        "ops_per_second": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "latency": summarize(latencies),
+    }
+    if lock is not None:
+        result["lock_wait"] = summarize(lock.waits)
+        result["lock_hold"] = summarize(lock.holds)
+        lock.waits.clear()
+        lock.holds.clear()
+    return result
+
+
+def bench_progress_stream(
+    stream: Any, session_count: int, events: int, threads: int
+) -> Dict[str, Any]:
+    """register -> publish (events per session) -> close, one listener per session."""
+    lock = TimedLock() if hasattr(stream, "_lock") else None
+    if lock is not None:
+        stream._lock = lock
+    sessions = [f"bench-{i}" for i in range(session_count)]
+    listeners: Dict[str, Any] = {}
+    listeners_lock = threading.Lock()
+    results: Dict[str, Any] = {}
+
+    def register(chunk: List[str], latencies: List[float]) -> None:
+        for session_id in chunk:
+            started = time.perf_counter()
+            listener = stream.register(session_id)
+            latencies.append(time.perf_counter() - started)
+            with listeners_lock:
+                listeners[session_id] = listener
+
+    def publish(chunk: List[str], latencies: List[float]) -> None:
+        # Interleave sessions the way concurrent downloads would
+        for n in range(events):
+            message = f"Download progress: {n}%"
+            for session_id in chunk:
+                started = time.perf_counter()
+                stream.publish(session_id, message)
+                latencies.append(time.perf_counter() - started)
+
+    def close(chunk: List[str], latencies: List[float]) -> None:
+        for session_id in chunk:
+            started = time.perf_counter()
+            stream.close(session_id)
+            latencies.append(time.perf_counter() - started)
+
+    elapsed, latencies = run_threads(register, sessions, threads)
+    results["register"] = operation_result(elapsed, latencies, lock)
+
+    elapsed, latencies = run_threads(publish, sessions, threads)
+    results["publish"] = operation_result(elapsed, latencies, lock)
+
+    # Nobody consumed during publish, so this is the worst-case backlog
+    backlogs = [
+        listener.qsize() for listener in listeners.values() if hasattr(listener, "qsize")
+    ]
+    if backlogs:
+        results["listener_backlog"] = {
+            "max": max(backlogs),
+            "total": sum(backlogs),
+        }
+
+    elapsed, latencies = run_threads(close, sessions, threads)
+    results["close"] = operation_result(elapsed, latencies, lock)
+    return results
+
+
+def bench_job_status_store(
+    store: Any, session_count: int, events: int, threads: int
+) -> Dict[str, Any]:
+    """set_status (events per session) and get_status for every session."""
+    lock = TimedLock() if hasattr(store, "_lock") else None
+    if lock is not None:
+        store._lock = lock
+    sessions = [f"bench-{i}" for i in range(session_count)]
+    results: Dict[str, Any] = {}
+
+    def set_status(chunk: List[str], latencies: List[float]) -> None:
+        for n in range(events):
+            message = f"Download progress: {n}%"
+            for session_id in chunk:
+                started = time.perf_counter()
+                store.set_status(session_id, "in_progress", message)
+                latencies.append(time.perf_counter() - started)
+
+    def get_status(chunk: List[str], latencies: List[float]) -> None:
+        for session_id in chunk:
+            started = time.perf_counter()
+            store.get_status(session_id)
+            latencies.append(time.perf_counter() - started)
+
+    elapsed, latencies = run_threads(set_status, sessions, threads)
+    results["set_status"] = operation_result(elapsed, latencies, lock)
+
+    elapsed, latencies = run_threads(get_status, sessions, threads)
+    results["get_status"] = operation_result(elapsed, latencies, lock)
+    return results
+
+
+def git_revision() -> Optional[str]:
+    """Short revision of the checkout containing this script (None outside one)."""
+    try:
+        output = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        return output.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    """Lines comparing ops/s and p99 latency with a previous report."""
+    lines = []
+    for key, run in current["runs"].items():
+        base_run = baseline.get("runs", {}).get(key)
+        if not base_run:
+            continue
+        for store, operations in run.items():
+            for name, result in operations.items():
+                base = base_run.get(store, {}).get(name)
+                if not base or "ops_per_second" not in result:
+                    continue
+                ops = result["ops_per_second"]
+                base_ops = base.get("ops_per_second")
+                # Runs too short to time report no rate
+                ops_change = f"{(ops / base_ops - 1) * 100:+.1f}%" if ops and base_ops else "n/a"
+                lines.append(
+                    f"{key} {store}.{name}: {ops} ops/s"
+                    f" ({ops_change}), p99 {result['latency']['p99_us']}us"
+                    f" (was {base['latency']['p99_us']}us)"
+                )
+    return lines
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sessions",
+        default=DEFAULT_SESSION_COUNTS,
+        help="comma separated concurrent session counts",
+    )
+    parser.add_argument("--events", type=int, default=DEFAULT_EVENTS_PER_SESSION)
+    parser.add_argument("--threads", type=int, default=DEFAULT_THREADS)
+    parser.add_argument("--backend", choices=("memory", "sqlite"), default="memory")
+    parser.add_argument("--output", help="write JSON report to this file")
+    parser.add_argument("--compare", help="previous JSON report to compare against")
+    parser.add_argument(
+        "--label",
+        default=os.getenv("BENCH_LABEL"),
+        help="version label for the report (default: git revision)",
+    )
+    args = parser.parse_args()
+
+    report: Dict[str, Any] = {
+        "revision": args.label or git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "backend": args.backend,
+        "events_per_session": args.events,
+        "threads": args.threads,
+        "runs": {},
+    }
+
+    for session_count in [int(n) for n in args.sessions.split(",")]:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            if args.backend == "sqlite":
+                db_path = f"{temp_dir}/state.sqlite3"
+                stream: Any = SqliteProgressStream(db_path)
+                store: Any = SqliteJobStatusStore(db_path)
+            else:
+                stream = ProgressStream()
+                store = JobStatusStore()
+            report["runs"][f"sessions={session_count}"] = {
+                "progress_stream": bench_progress_stream(
+                    stream, session_count, args.events, args.threads
+                ),
+                "job_status_store": bench_job_status_store(
+                    store, session_count, args.events, args.threads
+                ),
+            }
+        print(f"sessions={session_count} done", flush=True)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print("\n".join(compare(report, baseline)))
+
+
+if __name__ == "__main__":
+    main()
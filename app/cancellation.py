@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+import os
+import select
+import signal
+import socket
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from exceptions import JobCancelledError, JobTimeoutError
+from job_status import job_status_store
+
+# Per-phase deadlines in seconds (0 disables the limit). The queue has none by
+# default: aging in the scheduler already guarantees every job starts eventually.
+DEFAULT_PHASE_TIMEOUTS: Dict[str, int] = {
+    "queue": 0,
+    "extract": 60,
+    "download": 300,
+    "postprocess": 900,
+}
+# Phases whose deadline counts from the last progress, not from the phase start,
+# so long transfers that keep moving are never cut off
+INACTIVITY_PHASES = ("download", "postprocess")
+WATCHDOG_INTERVAL_SECONDS: float = 0.5
+
+
+def get_phase_timeouts() -> Dict[str, int]:
+    """Return per-phase timeouts, overridable with JOB_<PHASE>_TIMEOUT_SECONDS."""
+    return {
+        phase: int(os.getenv(f"JOB_{phase.upper()}_TIMEOUT_SECONDS", default))
+        for phase, default in DEFAULT_PHASE_TIMEOUTS.items()
+    }
+
+
+def kill_child_processes(marker: str) -> int:
+    """Kill child processes of this process whose command line contains marker.
+
+    yt-dlp runs ffmpeg without exposing the process, so the job's unique
+    staging path is used to find it. Linux only (reads /proc).
+    """
+    killed = 0
+    own_pid = os.getpid()
+    encoded_marker = marker.encode()
+    try:
+        pids = [int(name) for name in os.listdir("/proc") if name.isdigit()]
+    except OSError:
+        return 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat", "r") as f:
+                # Field after the parenthesised command name is state, then ppid
+                parent_pid = int(f.read().rsplit(")", 1)[1].split()[1])
+            if parent_pid != own_pid:
+                continue
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                if encoded_marker not in f.read():
+                    continue
+            os.kill(pid, signal.SIGKILL)
+            killed += 1
+        except (OSError, ValueError, IndexError):
+            continue
+    return killed
+
+
+def client_disconnected(sock: socket.socket) -> bool:
+    """Return True when the peer has closed the connection."""
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+        if not readable:
+            return False
+        # Readable with nothing to read means EOF
+        return sock.recv(1, socket.MSG_PEEK) == b""
+    except ValueError:
+        # TLS sockets cannot be peeked; treat as still connected
+        return False
+    except OSError:
+        return True
+
+
+class CancelToken:
+    """Cancellation state of a single job."""
+
+    def __init__(self, job_id: str, timeouts: Dict[str, int]) -> None:
+        self.job_id = job_id
+        self.timeouts = timeouts
+        self.phase: Optional[str] = None
+        self.deadline: Optional[float] = None
+        self.reason: Optional[str] = None
+        self.timed_out = False
+        # Connection of the request that started the job, watched until the response starts
+        self.client_socket: Optional[socket.socket] = None
+        self._callbacks: List[Callable[[], None]] = []
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def enter_phase(self, phase: str) -> None:
+        """Start the deadline of a new phase."""
+        timeout = self.timeouts.get(phase, 0)
+        with self._lock:
+            self.phase = phase
+            self.deadline = time.monotonic() + timeout if timeout > 0 else None
+
+    def touch(self) -> None:
+        """Record progress, moving an inactivity deadline forward."""
+        with self._lock:
+            if self.phase not in INACTIVITY_PHASES:
+                return
+            timeout = self.timeouts.get(self.phase, 0)
+            if timeout > 0:
+                self.deadline = time.monotonic() + timeout
+
+    def add_callback(self, callback: Callable[[], None]) -> None:
+        """Run callback on cancellation (immediately if already cancelled)."""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def remove_callback(self, callback: Callable[[], None]) -> None:
+        """Stop running callback on cancellation."""
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def cancel(self, reason: str, timed_out: bool = False) -> None:
+        """Cancel the job and release its resources through the callbacks."""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self.timed_out = timed_out
+            self._event.set()
+            callbacks = list(self._callbacks)
+            self._callbacks.clear()
+        print(f"Job {self.job_id} cancelled: {reason}", flush=True)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Cancel callback failed: {e}", flush=True)
+
+    def raise_if_cancelled(self) -> None:
+        """Raise JobCancelledError (or JobTimeoutError) if the job was cancelled."""
+        if not self._event.is_set():
+            return
+        if self.timed_out:
+            raise JobTimeoutError(f"タイムアウトしました: {self.reason}")
+        raise JobCancelledError(f"キャンセルされました: {self.reason}")
+
+
+class CancellationRegistry:
+    """Tracks running jobs and cancels them on request, disconnect or deadline.
+
+    A watchdog thread checks phase deadlines, the client connection and
+    cancellation requests made through the job status store (which may come
+    from another replica).
+    """
+
+    def __init__(self) -> None:
+        self._tokens: Dict[str, CancelToken] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def create(self, job_id: str) -> CancelToken:
+        """Register a new running job."""
+        token = CancelToken(job_id, get_phase_timeouts())
+        with self._lock:
+            self._tokens[job_id] = token
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._watch, name="job-watchdog", daemon=True
+                )
+                self._thread.start()
+        return token
+
+    def remove(self, job_id: str) -> None:
+        """Forget a finished job and any cancellation request left for it."""
+        with self._lock:
+            self._tokens.pop(job_id, None)
+        job_status_store.clear_cancel_request(job_id)
+
+    def cancel(self, job_id: str, reason: str) -> bool:
+        """Cancel a job running in this process; returns False if it is not here."""
+        with self._lock:
+            token = self._tokens.get(job_id)
+        if token is None:
+            return False
+        token.cancel(reason)
+        return True
+
+    def _check(self, token: CancelToken, now: float) -> None:
+        if token.deadline is not None and now > token.deadline:
+            if token.phase in INACTIVITY_PHASES:
+                reason = f"no progress in {token.phase} phase for {token.timeouts[token.phase]}s"
+            else:
+                reason = f"{token.phase} phase exceeded its deadline"
+            token.cancel(reason, timed_out=True)
+        elif token.client_socket is not None and client_disconnected(token.client_socket):
+            token.cancel("client disconnected")
+        elif job_status_store.is_cancel_requested(token.job_id):
+            token.cancel("cancelled by user")
+
+    def _watch(self) -> None:
+        """Watchdog loop"""
+        while True:
+            time.sleep(WATCHDOG_INTERVAL_SECONDS)
+            with self._lock:
+                tokens = [t for t in self._tokens.values() if not t.cancelled]
+            now = time.monotonic()
+            for token in tokens:
+                try:
+                    self._check(token, now)
+                except Exception as e:
+                    print(f"Watchdog check failed for {token.job_id}: {e}", flush=True)
+
+
+cancellation_registry = CancellationRegistry()
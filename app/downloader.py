@@ -1,14 +1,96 @@
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 import os
+import subprocess
 import tempfile
+import threading
 import shutil
+import urllib.request
 import yt_dlp
 
-from video_utils import is_valid_video_url, clean_video_url
+from video_utils import is_valid_video_url, clean_video_url, extract_media_id
 from file_utils import create_safe_filename, create_download_filename
-from exceptions import VideoDownloadError, FileNotFoundError
+from exceptions import (
+    VideoDownloadError,
+    FileNotFoundError,
+    VideoInfoError,
+    AudioStreamUnavailableError,
+    JobCancelledError,
+)
 from progress import progress_stream
 from job_status import job_status_store
+from media_store import MediaStore, create_media_key
+from metadata_cache import metadata_cache
+from cancellation import CancelToken, kill_child_processes
+from profiling import profiler
+
+VIDEO_FORMAT: str = "bestvideo+bestaudio/best"
+AUDIO_QUALITY_KBPS: int = 192
+# Progressive HTTP(S) sources only; segmented (HLS/DASH) sources cannot be piped as one byte stream
+STREAM_AUDIO_FORMAT: str = (
+    "bestaudio[protocol^=http][protocol!*=dash]/best[protocol^=http][protocol!*=dash]"
+)
+STREAM_CHUNK_SIZE: int = 64 * 1024
+FFMPEG_BINARY: str = "ffmpeg"
+# Bounds how long a stalled extractor or download blocks before cancellation is noticed
+SOCKET_TIMEOUT_SECONDS: int = 30
+
+
+def _format_size(fmt: Dict[str, Any]) -> Optional[int]:
+    """Return exact or approximate size of a yt-dlp format in bytes"""
+    size = fmt.get("filesize") or fmt.get("filesize_approx")
+    return int(size) if size else None
+
+
+def summarize_media_info(
+    info_dict: Dict[str, Any], media_id: Optional[Tuple[str, str]] = None
+) -> Dict[str, Any]:
+    """Reduce a yt-dlp info dict to the metadata needed before downloading"""
+    # Multi-video posts come back as playlists, the first entry is what gets downloaded
+    entries = info_dict.get("entries")
+    if entries:
+        info_dict = next(iter(entries))
+
+    formats: List[Dict[str, Any]] = []
+    heights = set()
+    for fmt in info_dict.get("formats") or []:
+        # Skip storyboard images
+        if fmt.get("ext") == "mhtml":
+            continue
+        height = fmt.get("height")
+        if height and fmt.get("vcodec") != "none":
+            heights.add(int(height))
+        formats.append(
+            {
+                "format_id": fmt.get("format_id"),
+                "ext": fmt.get("ext"),
+                "resolution": fmt.get("resolution"),
+                "height": height,
+                "vcodec": fmt.get("vcodec"),
+                "acodec": fmt.get("acodec"),
+                "filesize": _format_size(fmt),
+            }
+        )
+
+    # Selected video (+ audio) formats are what a video download fetches
+    requested = info_dict.get("requested_formats") or [info_dict]
+    sizes = [_format_size(fmt) for fmt in requested]
+    video_size = sum(s for s in sizes if s) if all(sizes) else None
+
+    # Audio is re-encoded at a fixed bitrate, so its size follows from the duration
+    duration = info_dict.get("duration")
+    audio_size = int(duration * AUDIO_QUALITY_KBPS * 1000 / 8) if duration else None
+
+    return {
+        "platform": media_id[0] if media_id else None,
+        "media_id": media_id[1] if media_id else None,
+        "title": str(info_dict.get("title", "download")),
+        "duration": duration,
+        "uploader": info_dict.get("uploader"),
+        "thumbnail": info_dict.get("thumbnail"),
+        "resolutions": [f"{h}p" for h in sorted(heights, reverse=True)],
+        "estimated_size": {"video": video_size, "audio": audio_size},
+        "formats": formats,
+    }
 
 
 class ProgressHook:
@@ -19,6 +101,7 @@ class ProgressHook:
     def __init__(self) -> None:
         self.last_percent = -1
         self.session_id: Optional[str] = None
+        self.cancel_token: Optional[CancelToken] = None
 
     def reset(self) -> None:
         """Reset progress tracking for new download"""
@@ -28,32 +111,44 @@ class ProgressHook:
         """Bind the hook to a session for SSE publishing"""
         self.session_id = session_id
 
+    def attach_cancel_token(self, cancel_token: Optional[CancelToken]) -> None:
+        """Abort the download from the hook once the job is cancelled"""
+        self.cancel_token = cancel_token
+
     def _emit(self, message: str) -> None:
         """Publish progress to console and SSE"""
         print(message, flush=True)
         if self.session_id:
-            progress_stream.publish(self.session_id, message)
-            job_status_store.set_status(
-                self.session_id, "in_progress", message
-            )
+            with profiler.timer("progress_hook.publish"):
+                progress_stream.publish(self.session_id, message)
+                job_status_store.set_status(
+                    self.session_id, "in_progress", message
+                )
 
     def __call__(self, d: Dict[str, Any]) -> None:
         """Progress hook for yt-dlp to show download progress"""
-        if d["status"] == "downloading":
-            if "total_bytes" in d and d["total_bytes"]:
-                percent = d["downloaded_bytes"] / d["total_bytes"] * 100
-                # Print progress every 1%
-                if int(percent) != self.last_percent:
-                    self.last_percent = int(percent)
-                    self._emit(f"Download progress: {int(percent)}%")
-            elif "total_bytes_estimate" in d and d["total_bytes_estimate"]:
-                percent = d["downloaded_bytes"] / d["total_bytes_estimate"] * 100
-                # Print progress every 1%
-                if int(percent) != self.last_percent:
-                    self.last_percent = int(percent)
-                    self._emit(f"Download progress: {int(percent)}% (estimated)")
-        elif d["status"] == "finished":
-            self._emit("Download completed")
+        # Raising here makes yt-dlp stop the transfer
+        if self.cancel_token:
+            self.cancel_token.raise_if_cancelled()
+            # Called for every received chunk, so a flowing download never times out
+            self.cancel_token.touch()
+        # Sampled timing of the hot path (no-op unless PROFILING is enabled)
+        with profiler.timer("progress_hook"):
+            if d["status"] == "downloading":
+                if "total_bytes" in d and d["total_bytes"]:
+                    percent = d["downloaded_bytes"] / d["total_bytes"] * 100
+                    # Print progress every 1%
+                    if int(percent) != self.last_percent:
+                        self.last_percent = int(percent)
+                        self._emit(f"Download progress: {int(percent)}%")
+                elif "total_bytes_estimate" in d and d["total_bytes_estimate"]:
+                    percent = d["downloaded_bytes"] / d["total_bytes_estimate"] * 100
+                    # Print progress every 1%
+                    if int(percent) != self.last_percent:
+                        self.last_percent = int(percent)
+                        self._emit(f"Download progress: {int(percent)}% (estimated)")
+            elif d["status"] == "finished":
+                self._emit("Download completed")
 
 
 class PostProcessorHook:
@@ -61,11 +156,16 @@ class PostProcessorHook:
 
     def __init__(self) -> None:
         self.session_id: Optional[str] = None
+        self.cancel_token: Optional[CancelToken] = None
 
     def attach_session(self, session_id: Optional[str]) -> None:
         """Bind the hook to a session for SSE publishing"""
         self.session_id = session_id
 
+    def attach_cancel_token(self, cancel_token: Optional[CancelToken]) -> None:
+        """Track the postprocess phase deadline of the job"""
+        self.cancel_token = cancel_token
+
     def _emit(self, message: str) -> None:
         """Publish postprocessing status to console and SSE"""
         print(message, flush=True)
@@ -80,6 +180,13 @@ class PostProcessorHook:
         postprocessor = d.get("postprocessor")
         status = d.get("status")
 
+        if self.cancel_token:
+            self.cancel_token.raise_if_cancelled()
+            if status == "started":
+                self.cancel_token.enter_phase("postprocess")
+            else:
+                self.cancel_token.touch()
+
         if postprocessor not in ["FFmpegExtractAudio", "ExtractAudio"]:
             print(f"Unexpected postprocessor: {postprocessor}")
             return
@@ -92,6 +199,71 @@ class PostProcessorHook:
             self._emit("Audio conversion completed")
 
 
+class AudioStream:
+    """mp3 output of an ffmpeg process that is fed from a source download"""
+
+    def __init__(
+        self,
+        process: "subprocess.Popen[bytes]",
+        source: Any,
+        feeder: threading.Thread,
+        feed_errors: List[BaseException],
+        session_id: Optional[str],
+        cancel_token: Optional[CancelToken] = None,
+    ) -> None:
+        self.process = process
+        self.source = source
+        self.feeder = feeder
+        self.feed_errors = feed_errors
+        self.session_id = session_id
+        self.cancel_token = cancel_token
+        self._closed = False
+        self._lock = threading.Lock()
+        if cancel_token:
+            # Cancellation kills ffmpeg, which ends the read loop below
+            cancel_token.add_callback(self.close)
+
+    def __iter__(self) -> Iterator[bytes]:
+        """Yield mp3 chunks as ffmpeg produces them"""
+        try:
+            while True:
+                chunk = self.process.stdout.read1(STREAM_CHUNK_SIZE)  # type: ignore[union-attr]
+                if not chunk:
+                    break
+                if self.cancel_token:
+                    # The client read the previous chunk, so a slow reader is not a stall
+                    self.cancel_token.touch()
+                yield chunk
+            self.process.wait()
+            self.feeder.join()
+            if self.cancel_token:
+                self.cancel_token.raise_if_cancelled()
+            if self.process.returncode != 0 or self.feed_errors:
+                stderr = self.process.stderr.read().decode(errors="replace").strip()  # type: ignore[union-attr]
+                if self.feed_errors:
+                    detail = stderr or str(self.feed_errors[0])
+                else:
+                    detail = stderr or f"ffmpeg exited with {self.process.returncode}"
+                raise VideoDownloadError(f"音声変換エラー: {detail}")
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        """Stop ffmpeg and the source download (safe to call more than once, from any thread)"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        if self.cancel_token:
+            self.cancel_token.remove_callback(self.close)
+        if self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        self.source.close()
+        if self.session_id:
+            progress_stream.close(self.session_id)
+
+
 class Downloader:
     """Video downloader class"""
 
@@ -101,19 +273,48 @@ class Downloader:
         self.progress_hook = ProgressHook()
         self.postprocessor_hook = PostProcessorHook()
 
-    def get_video_title(self, url: str) -> str:
-        """Get video title"""
+    def _media_cache_key(self, url: str) -> str:
+        """Metadata cache key (canonical media ID when available)"""
+        media_id = extract_media_id(url)
+        return ":".join(media_id) if media_id else url
+
+    def get_cached_media_info(self, url: str) -> Optional[Dict[str, Any]]:
+        """Get previously extracted metadata without extracting"""
+        return metadata_cache.get(self._media_cache_key(url))
+
+    def get_media_info(self, url: str) -> Dict[str, Any]:
+        """Get compact video metadata (cached, never downloads or postprocesses)"""
+        media_id = extract_media_id(url)
+        cache_key = self._media_cache_key(url)
+        cached = metadata_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
         ydl_opts = {
             "quiet": True,
             "no_warnings": True,
+            "skip_download": True,
+            "format": VIDEO_FORMAT,
+            # Keep extraction off the disk (yt-dlp caches player data by default)
+            "cachedir": False,
+            "socket_timeout": SOCKET_TIMEOUT_SECONDS,
         }
         try:
             with yt_dlp.YoutubeDL(ydl_opts) as ydl:
                 info_dict = ydl.extract_info(url, download=False)
-                if isinstance(info_dict, dict):
-                    return str(info_dict.get("title", "download"))
-                else:
-                    return "download"
+        except Exception as e:
+            raise VideoInfoError(f"動画情報の取得エラー: {str(e)}")
+        if not isinstance(info_dict, dict):
+            raise VideoInfoError("動画情報を取得できませんでした")
+
+        info = summarize_media_info(info_dict, media_id)
+        metadata_cache.put(cache_key, info)
+        return info
+
+    def get_video_title(self, url: str) -> str:
+        """Get video title"""
+        try:
+            return str(self.get_media_info(url)["title"])
         except Exception:
             # Fallback when title acquisition fails (invalid URLs, deleted videos, etc.)
             return "download"
@@ -127,6 +328,7 @@ class Downloader:
             "quiet": True,
             "no_warnings": True,
             "progress_hooks": [self.progress_hook],
+            "socket_timeout": SOCKET_TIMEOUT_SECONDS,
         }
 
         if format_type == "audio":
@@ -137,7 +339,7 @@ class Downloader:
                         {
                             "key": "FFmpegExtractAudio",
                             "preferredcodec": "mp3",
-                            "preferredquality": "192",
+                            "preferredquality": str(AUDIO_QUALITY_KBPS),
                         }
                     ],
                     "postprocessor_hooks": [self.postprocessor_hook],
@@ -146,7 +348,7 @@ class Downloader:
         else:
             base_opts.update(
                 {
-                    "format": "bestvideo+bestaudio/best",
+                    "format": VIDEO_FORMAT,
                     "merge_output_format": "mp4",
                 }
             )
@@ -154,17 +356,30 @@ class Downloader:
         return base_opts
 
     def execute_download(
-        self, url: str, ydl_opts: Dict[str, Any], session_id: Optional[str]
+        self,
+        url: str,
+        ydl_opts: Dict[str, Any],
+        session_id: Optional[str],
+        cancel_token: Optional[CancelToken] = None,
     ) -> None:
         """Execute download"""
         try:
             # Reset progress tracking for new download
             self.progress_hook.reset()
             self.progress_hook.attach_session(session_id)
+            self.progress_hook.attach_cancel_token(cancel_token)
             self.postprocessor_hook.attach_session(session_id)
+            self.postprocessor_hook.attach_cancel_token(cancel_token)
+            if cancel_token:
+                cancel_token.enter_phase("download")
             with yt_dlp.YoutubeDL(ydl_opts) as ydl:
                 ydl.download([url])
+        except JobCancelledError:
+            raise
         except Exception as e:
+            # yt-dlp may wrap the hook's exception, or ffmpeg died because it was killed
+            if cancel_token:
+                cancel_token.raise_if_cancelled()
             raise VideoDownloadError(f"ダウンロードエラー: {str(e)}")
 
     def find_downloaded_file(self, temp_dir: str) -> str:
@@ -179,12 +394,146 @@ class Downloader:
 
         return downloaded_files[0]
 
+    def build_ffmpeg_stream_command(self) -> List[str]:
+        """Build ffmpeg command that transcodes stdin to mp3 on stdout"""
+        return [
+            FFMPEG_BINARY,
+            "-hide_banner",
+            "-loglevel",
+            "error",
+            "-i",
+            "pipe:0",
+            "-vn",
+            "-codec:a",
+            "libmp3lame",
+            "-b:a",
+            f"{AUDIO_QUALITY_KBPS}k",
+            "-f",
+            "mp3",
+            "pipe:1",
+        ]
+
+    def _feed_source(
+        self,
+        source: Any,
+        sink: Any,
+        total_bytes: Optional[int],
+        errors: List[BaseException],
+    ) -> None:
+        """Copy source bytes into ffmpeg stdin (runs in a background thread)"""
+        downloaded = 0
+        try:
+            while True:
+                chunk = source.read(STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                sink.write(chunk)
+                downloaded += len(chunk)
+                self.progress_hook(
+                    {
+                        "status": "downloading",
+                        "downloaded_bytes": downloaded,
+                        "total_bytes": total_bytes,
+                    }
+                )
+            self.progress_hook({"status": "finished"})
+        except Exception as e:
+            # ffmpeg was stopped (client gone) or the source connection failed
+            errors.append(e)
+        finally:
+            try:
+                sink.close()
+            except OSError:
+                pass
+
+    def stream_audio(
+        self,
+        url: str,
+        session_id: Optional[str] = None,
+        cancel_token: Optional[CancelToken] = None,
+    ) -> Tuple["AudioStream", str]:
+        """Stream source audio through ffmpeg and return (mp3 stream, filename)
+
+        Nothing is written to disk: the source is piped into ffmpeg's stdin and
+        the mp3 output is yielded from its stdout as it is produced.
+        """
+        if not is_valid_video_url(url):
+            raise ValueError("有効な動画URL（YouTube/Twitter/TikTok）ではありません")
+        clean_url = clean_video_url(url)
+
+        ydl_opts = {
+            "quiet": True,
+            "no_warnings": True,
+            "skip_download": True,
+            "format": STREAM_AUDIO_FORMAT,
+            "cachedir": False,
+            "socket_timeout": SOCKET_TIMEOUT_SECONDS,
+        }
+        if cancel_token:
+            cancel_token.enter_phase("extract")
+        try:
+            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                info_dict = ydl.extract_info(clean_url, download=False)
+        except Exception as e:
+            if cancel_token:
+                cancel_token.raise_if_cancelled()
+            if "requested format is not available" in str(e).lower():
+                raise AudioStreamUnavailableError(str(e))
+            raise VideoDownloadError(f"ダウンロードエラー: {str(e)}")
+        if not isinstance(info_dict, dict) or not info_dict.get("url"):
+            raise AudioStreamUnavailableError("ストリーミング可能な音声形式がありません")
+
+        filename = create_download_filename(
+            create_safe_filename(str(info_dict.get("title", "download"))), "audio"
+        )
+        source_request = urllib.request.Request(
+            info_dict["url"], headers=info_dict.get("http_headers") or {}
+        )
+
+        if cancel_token:
+            cancel_token.raise_if_cancelled()
+            cancel_token.enter_phase("download")
+
+        self.progress_hook.reset()
+        self.progress_hook.attach_session(session_id)
+        self.progress_hook.attach_cancel_token(cancel_token)
+        source: Any = None
+        try:
+            source = urllib.request.urlopen(source_request, timeout=SOCKET_TIMEOUT_SECONDS)
+            process = subprocess.Popen(
+                self.build_ffmpeg_stream_command(),
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+        except Exception as e:
+            if source is not None:
+                source.close()
+            if session_id:
+                progress_stream.close(session_id)
+            raise VideoDownloadError(f"ダウンロードエラー: {str(e)}")
+
+        feed_errors: List[BaseException] = []
+        feeder = threading.Thread(
+            target=self._feed_source,
+            args=(source, process.stdin, _format_size(info_dict), feed_errors),
+            daemon=True,
+        )
+        feeder.start()
+
+        return (
+            AudioStream(process, source, feeder, feed_errors, session_id, cancel_token),
+            filename,
+        )
+
     def download_video(
         self,
         url: str,
         format_type: str = "video",
         download_dir: str = "/app/downloads",
         session_id: Optional[str] = None,
+        media_store: Optional[MediaStore] = None,
+        cancel_token: Optional[CancelToken] = None,
     ) -> Tuple[str, str]:
         """Download video"""
         try:
@@ -194,13 +543,44 @@ class Downloader:
             # Remove unnecessary parameters from URL (to stabilize yt-dlp processing)
             clean_url = clean_video_url(url)
 
+            # Different URL forms of the same video share one stored file
+            media_id = extract_media_id(clean_url)
+            media_key = create_media_key(media_id, format_type) if media_id else None
+            if media_store and media_key:
+                stored = media_store.checkout(media_key)
+                if stored:
+                    print(f"Reuse stored file for {media_key}", flush=True)
+                    if session_id:
+                        progress_stream.publish(
+                            session_id, "Using previously downloaded file"
+                        )
+                    return stored
+
+            # Stage inside the download directory when possible so storing is a rename, not a copy
+            staging_dir = media_store.staging_dir if media_store else None
+
             # Use temporary directory (because yt-dlp generates unpredictable filenames)
-            with tempfile.TemporaryDirectory() as temp_dir:
+            # Leaving the block on cancellation removes partial files right away
+            with tempfile.TemporaryDirectory(dir=staging_dir) as temp_dir:
+                if cancel_token:
+                    cancel_token.enter_phase("extract")
                 title = self.get_video_title(clean_url)
                 safe_title = create_safe_filename(title)
 
                 ydl_opts = self.build_ytdlp_options(temp_dir, format_type)
-                self.execute_download(clean_url, ydl_opts, session_id)
+
+                def kill_ffmpeg() -> None:
+                    # ffmpeg started by yt-dlp (merge / audio extraction) is found by the staging path
+                    kill_child_processes(temp_dir)
+
+                if cancel_token:
+                    cancel_token.raise_if_cancelled()
+                    cancel_token.add_callback(kill_ffmpeg)
+                try:
+                    self.execute_download(clean_url, ydl_opts, session_id, cancel_token)
+                finally:
+                    if cancel_token:
+                        cancel_token.remove_callback(kill_ffmpeg)
 
                 downloaded_file = self.find_downloaded_file(temp_dir)
                 source_file = os.path.join(temp_dir, downloaded_file)
@@ -208,6 +588,11 @@ class Downloader:
                 final_filename = create_download_filename(
                     safe_title, format_type, downloaded_file
                 )
+
+                if media_store:
+                    destination = media_store.add(source_file, final_filename, media_key)
+                    return destination, final_filename
+
                 destination = os.path.join(download_dir, final_filename)
 
                 # Move file from temporary directory to persistent location to avoid extra copy
@@ -225,7 +610,11 @@ def download_video(
     format_type: str = "video",
     download_dir: str = "/app/downloads",
     session_id: Optional[str] = None,
+    media_store: Optional[MediaStore] = None,
+    cancel_token: Optional[CancelToken] = None,
 ) -> Tuple[str, str]:
     """Download video (backward compatibility function)"""
     downloader = Downloader()
-    return downloader.download_video(url, format_type, download_dir, session_id)
+    return downloader.download_video(
+        url, format_type, download_dir, session_id, media_store, cancel_token
+    )
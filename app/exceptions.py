@@ -23,3 +23,27 @@ class FileNotFoundError(DownloadError):
     """Downloaded file not found error"""
 
     pass
+
+
+class VideoInfoError(DownloadError):
+    """Video metadata extraction error"""
+
+    pass
+
+
+class AudioStreamUnavailableError(DownloadError):
+    """No source format that can be piped through ffmpeg"""
+
+    pass
+
+
+class JobCancelledError(DownloadError):
+    """Job was cancelled (by the user or because the client went away)"""
+
+    pass
+
+
+class JobTimeoutError(JobCancelledError):
+    """Job exceeded the deadline of its current phase"""
+
+    pass
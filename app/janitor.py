@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+# Defaults for download directory housekeeping (0 disables the limit)
+DEFAULT_QUOTA_BYTES: int = 0
+DEFAULT_MAX_AGE_SECONDS: int = 0
+DEFAULT_INTERVAL_SECONDS: int = 60
+
+
+class FileEntry:
+    """Index entry for a file in the download directory."""
+
+    __slots__ = ("size", "last_served", "in_use")
+
+    def __init__(self, size: int, last_served: float) -> None:
+        self.size = size
+        self.last_served = last_served
+        self.in_use = 0
+
+
+class DownloadJanitor:
+    """Quota and age based eviction for the download directory.
+
+    Files are kept in an index ordered from least to most recently served,
+    so each pass only looks at the head of the index instead of scanning
+    the directory. Files that are currently being served are never evicted.
+    """
+
+    def __init__(
+        self,
+        root_dir: str,
+        quota_bytes: int = DEFAULT_QUOTA_BYTES,
+        max_age_seconds: int = DEFAULT_MAX_AGE_SECONDS,
+        interval_seconds: int = DEFAULT_INTERVAL_SECONDS,
+        remove_file: Callable[[str], None] = os.remove,
+    ) -> None:
+        self.root_dir = root_dir
+        self.quota_bytes = quota_bytes
+        self.max_age_seconds = max_age_seconds
+        self.interval_seconds = interval_seconds
+        self._remove_file = remove_file
+        self._index: "OrderedDict[str, FileEntry]" = OrderedDict()
+        self._total_bytes = 0
+        self._evicted_files = 0
+        self._evicted_bytes = 0
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def load_existing(self) -> None:
+        """Build the index from files already in the root directory (once at startup)."""
+        entries = []
+        with os.scandir(self.root_dir) as it:
+            for entry in it:
+                # Hidden entries are internal bookkeeping, not served files
+                if entry.name.startswith(".") or not entry.is_file(follow_symlinks=False):
+                    continue
+                stat = entry.stat(follow_symlinks=False)
+                entries.append((stat.st_mtime, entry.path, stat.st_size))
+
+        # Without serve history, modification time is the best ordering available
+        entries.sort()
+        with self._lock:
+            for mtime, path, size in entries:
+                if path not in self._index:
+                    self._index[path] = FileEntry(size, mtime)
+                    self._total_bytes += size
+
+    def track(self, path: str, acquire: bool = False) -> None:
+        """Add or refresh a file in the index and mark it as just served.
+
+        With acquire=True the file is also marked as in use in the same step,
+        so a pass running in between cannot evict it before it is served.
+        """
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        now = time.time()
+        with self._lock:
+            entry = self._index.get(path)
+            if entry is None:
+                entry = FileEntry(size, now)
+                self._index[path] = entry
+                self._total_bytes += size
+            else:
+                self._total_bytes += size - entry.size
+                entry.size = size
+                entry.last_served = now
+                self._index.move_to_end(path)
+            if acquire:
+                entry.in_use += 1
+
+    def release(self, path: str) -> None:
+        """Mark a file as no longer being served."""
+        with self._lock:
+            entry = self._index.get(path)
+            if entry is not None and entry.in_use > 0:
+                entry.in_use -= 1
+
+    def _select_victims(self, now: float) -> List[Tuple[str, FileEntry]]:
+        """Pop entries to evict from the index (caller must hold the lock)."""
+        victims: List[Tuple[str, FileEntry]] = []
+        remaining = self._total_bytes
+        for path, entry in self._index.items():
+            expired = (
+                self.max_age_seconds > 0
+                and now - entry.last_served > self.max_age_seconds
+            )
+            over_quota = self.quota_bytes > 0 and remaining > self.quota_bytes
+            if not expired and not over_quota:
+                # Index is ordered by last serve time, so nothing further qualifies
+                break
+            if entry.in_use:
+                continue
+            victims.append((path, entry))
+            remaining -= entry.size
+
+        for path, _ in victims:
+            self._index.pop(path)
+        self._total_bytes = remaining
+        return victims
+
+    def run_once(self) -> int:
+        """Run a single eviction pass and return the number of evicted files."""
+        with self._lock:
+            victims = self._select_victims(time.time())
+
+        evicted = 0
+        failed: List[Tuple[str, FileEntry]] = []
+        for path, entry in victims:
+            try:
+                self._remove_file(path)
+            except FileNotFoundError:
+                # Already gone, nothing left to account for
+                continue
+            except OSError as e:
+                print(f"Janitor: failed to remove {path}: {e}", flush=True)
+                failed.append((path, entry))
+                continue
+            evicted += 1
+            with self._lock:
+                self._evicted_files += 1
+                self._evicted_bytes += entry.size
+            print(f"Janitor: evicted {path}", flush=True)
+
+        if failed:
+            # Still on disk: put back at the head of the index so the next pass retries
+            with self._lock:
+                for path, entry in reversed(failed):
+                    if path in self._index:
+                        # Served again meanwhile and already re-tracked
+                        continue
+                    self._index[path] = entry
+                    self._index.move_to_end(path, last=False)
+                    self._total_bytes += entry.size
+        return evicted
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """Return disk usage and eviction counters."""
+        with self._lock:
+            stats: Dict[str, Union[int, float]] = {
+                "tracked_files": len(self._index),
+                "used_bytes": self._total_bytes,
+                "quota_bytes": self.quota_bytes,
+                "max_age_seconds": self.max_age_seconds,
+                "in_use_files": sum(1 for e in self._index.values() if e.in_use),
+                "evicted_files": self._evicted_files,
+                "evicted_bytes": self._evicted_bytes,
+            }
+        try:
+            disk = os.statvfs(self.root_dir)
+            stats["disk_total_bytes"] = disk.f_blocks * disk.f_frsize
+            stats["disk_free_bytes"] = disk.f_bavail * disk.f_frsize
+        except (OSError, AttributeError):
+            pass
+        return stats
+
+    def start(self) -> None:
+        """Start the background eviction thread."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(
+            target=self._run, name="download-janitor", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background eviction thread."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        """Background loop"""
+        while not self._stop_event.wait(self.interval_seconds):
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Janitor: pass failed: {e}", flush=True)
@@ -1,7 +1,10 @@
 from __future__ import annotations
 
 import threading
-from typing import Dict, Optional
+import time
+from typing import Dict, Optional, Set, Union
+
+from sqlite_state import SqliteDatabase, get_state_backend, get_state_db_path
 
 
 class JobStatusStore:
@@ -9,6 +12,7 @@ class JobStatusStore:
 
     def __init__(self) -> None:
         self._statuses: Dict[str, Dict[str, Optional[str]]] = {}
+        self._cancel_requests: Set[str] = set()
         self._lock = threading.Lock()
 
     def set_status(
@@ -26,10 +30,101 @@ class JobStatusStore:
                 return {"status": "not_found", "message": "指定されたjob_idは存在しません"}
             return dict(status)
 
+    def request_cancel(self, job_id: str) -> None:
+        """Flag the job for cancellation by whichever process runs it."""
+        with self._lock:
+            self._cancel_requests.add(job_id)
+
+    def is_cancel_requested(self, job_id: str) -> bool:
+        """Return True if cancellation was requested for the job."""
+        with self._lock:
+            return job_id in self._cancel_requests
+
+    def clear_cancel_request(self, job_id: str) -> None:
+        """Forget the cancellation request once the job has ended."""
+        with self._lock:
+            self._cancel_requests.discard(job_id)
+
     def clear(self, job_id: str) -> None:
         """Remove job status."""
         with self._lock:
             self._statuses.pop(job_id, None)
+            self._cancel_requests.discard(job_id)
+
+
+class SqliteJobStatusStore:
+    """Job status store shared between processes through SQLite."""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS job_statuses (
+        job_id TEXT PRIMARY KEY,
+        status TEXT NOT NULL,
+        message TEXT,
+        updated_at REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS job_cancellations (
+        job_id TEXT PRIMARY KEY,
+        requested_at REAL NOT NULL
+    );
+    """
+
+    def __init__(self, path: str) -> None:
+        self._db = SqliteDatabase(path, self.SCHEMA)
+
+    def set_status(
+        self, job_id: str, status: str, message: Optional[str] = None
+    ) -> None:
+        """Update or create job status."""
+        with self._db.connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO job_statuses (job_id, status, message, updated_at)"
+                " VALUES (?, ?, ?, ?)",
+                (job_id, status, message, time.time()),
+            )
+
+    def get_status(self, job_id: str) -> Dict[str, Optional[str]]:
+        """Return a copy of the current status."""
+        with self._db.connection() as conn:
+            row = conn.execute(
+                "SELECT status, message FROM job_statuses WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return {"status": "not_found", "message": "指定されたjob_idは存在しません"}
+        return {"status": row[0], "message": row[1]}
+
+    def request_cancel(self, job_id: str) -> None:
+        """Flag the job for cancellation by whichever process runs it."""
+        with self._db.connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO job_cancellations (job_id, requested_at) VALUES (?, ?)",
+                (job_id, time.time()),
+            )
+
+    def is_cancel_requested(self, job_id: str) -> bool:
+        """Return True if cancellation was requested for the job."""
+        with self._db.connection() as conn:
+            row = conn.execute(
+                "SELECT 1 FROM job_cancellations WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        return row is not None
+
+    def clear_cancel_request(self, job_id: str) -> None:
+        """Forget the cancellation request once the job has ended."""
+        with self._db.connection() as conn:
+            conn.execute("DELETE FROM job_cancellations WHERE job_id = ?", (job_id,))
+
+    def clear(self, job_id: str) -> None:
+        """Remove job status."""
+        with self._db.connection() as conn:
+            conn.execute("DELETE FROM job_statuses WHERE job_id = ?", (job_id,))
+            conn.execute("DELETE FROM job_cancellations WHERE job_id = ?", (job_id,))
+
+
+def create_job_status_store() -> Union[JobStatusStore, SqliteJobStatusStore]:
+    """Create job status store for the configured state backend."""
+    if get_state_backend() == "sqlite":
+        return SqliteJobStatusStore(get_state_db_path())
+    return JobStatusStore()
 
 
-job_status_store = JobStatusStore()
+job_status_store = create_job_status_store()
@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+HASH_CHUNK_SIZE: int = 1024 * 1024
+# Staging entries untouched for this long are leftovers of an interrupted run
+# (younger ones may belong to a download in progress on another replica)
+STALE_STAGING_SECONDS: int = 600
+# Files saved directly in the download directory before downloads were stored by hash
+LEGACY_MEDIA_EXTENSIONS: Tuple[str, ...] = (
+    ".mp4", ".webm", ".mkv", ".mov", ".mp3", ".m4a", ".opus", ".ogg", ".wav", ".flac",
+)
+
+
+def create_media_key(media_id: Tuple[str, str], format_type: str) -> str:
+    """Create lookup key for a (platform, media_id) pair and save format."""
+    platform, video_id = media_id
+    return f"{platform}:{video_id}:{format_type}"
+
+
+def hash_file(path: str) -> str:
+    """Return SHA-256 hex digest of file contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class MediaStore:
+    """Content-addressed storage for downloaded files.
+
+    Each distinct file is stored once under .objects/ named by its content
+    hash and served from there; the user-facing filename only goes out in
+    the response headers. Media keys of every URL alias map to the object,
+    so different URL forms of one video share a single copy.
+    """
+
+    def __init__(self, root_dir: str) -> None:
+        self.root_dir = root_dir
+        self.objects_dir = os.path.join(root_dir, ".objects")
+        self.staging_dir = os.path.join(root_dir, ".staging")
+        self._index_path = os.path.join(root_dir, ".media_index.json")
+        # media key -> {"object": object name, "filename": download filename}
+        self._media: Dict[str, Dict[str, str]] = {}
+        self._lock = threading.Lock()
+
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.staging_dir, exist_ok=True)
+        self._load_index()
+        self._clear_stale_staging()
+        self._import_legacy_files()
+
+    def _object_path(self, object_name: str) -> str:
+        return os.path.join(self.objects_dir, object_name)
+
+    def _load_index(self) -> None:
+        """Load persisted index, dropping entries whose object is gone."""
+        try:
+            with open(self._index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        for key, entry in data.get("media", {}).items():
+            if os.path.exists(self._object_path(entry.get("object", ""))):
+                self._media[key] = entry
+
+    def _clear_stale_staging(self) -> None:
+        """Remove partial downloads left in staging by a crash or restart."""
+        cutoff = time.time() - STALE_STAGING_SECONDS
+        with os.scandir(self.staging_dir) as it:
+            entries = list(it)
+        for entry in entries:
+            try:
+                # A directory is in use while anything below it is still being written
+                newest = entry.stat(follow_symlinks=False).st_mtime
+                if entry.is_dir(follow_symlinks=False):
+                    for dir_path, _, filenames in os.walk(entry.path):
+                        for name in filenames:
+                            newest = max(newest, os.lstat(os.path.join(dir_path, name)).st_mtime)
+                if newest > cutoff:
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    shutil.rmtree(entry.path)
+                else:
+                    os.remove(entry.path)
+                print(f"Removed stale staging entry {entry.path}", flush=True)
+            except OSError as e:
+                print(f"Failed to remove staging entry {entry.path}: {e}", flush=True)
+
+    def _import_legacy_files(self) -> None:
+        """Move media files from the old flat layout into the store.
+
+        They become objects without media keys, so the janitor's quota and
+        age limits apply to them like to any other stored file. Renaming
+        keeps the modification time the janitor orders them by.
+        """
+        with os.scandir(self.root_dir) as it:
+            legacy = [
+                entry.path
+                for entry in it
+                if not entry.name.startswith(".")
+                and entry.is_file(follow_symlinks=False)
+                and os.path.splitext(entry.name)[1].lower() in LEGACY_MEDIA_EXTENSIONS
+            ]
+        for path in legacy:
+            try:
+                self.add(path, os.path.basename(path))
+            except OSError as e:
+                print(f"Failed to import {path}: {e}", flush=True)
+                continue
+            print(f"Imported {path} into the media store", flush=True)
+
+    def _save_index(self) -> None:
+        """Persist index atomically (caller must hold the lock)."""
+        temp_path = self._index_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"media": self._media}, f, ensure_ascii=False)
+        os.replace(temp_path, self._index_path)
+
+    def checkout(self, media_key: str) -> Optional[Tuple[str, str]]:
+        """Return (object path, filename) for already stored media, or None on miss."""
+        with self._lock:
+            entry = self._media.get(media_key)
+            if entry is None:
+                return None
+            object_path = self._object_path(entry["object"])
+            if not os.path.exists(object_path):
+                self._media.pop(media_key, None)
+                self._save_index()
+                return None
+            return object_path, entry["filename"]
+
+    def add(self, source_path: str, filename: str, media_key: Optional[str] = None) -> str:
+        """Store source file (moving it) and return its object path."""
+        digest = hash_file(source_path)
+        _, ext = os.path.splitext(filename)
+        object_name = f"{digest}{ext}"
+        object_path = self._object_path(object_name)
+
+        with self._lock:
+            if os.path.exists(object_path):
+                # Identical content already stored, drop the duplicate
+                os.remove(source_path)
+            else:
+                shutil.move(source_path, object_path)
+            if media_key:
+                self._media[media_key] = {"object": object_name, "filename": filename}
+                self._save_index()
+            return object_path
+
+    def remove_object(self, object_path: str) -> None:
+        """Remove an object together with every media key pointing at it."""
+        object_name = os.path.basename(object_path)
+        with self._lock:
+            for key in [k for k, e in self._media.items() if e["object"] == object_name]:
+                self._media.pop(key, None)
+            self._save_index()
+            os.remove(object_path)
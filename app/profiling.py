@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Sequence
+
+DEFAULT_SAMPLE_RATE: float = 0.1
+# Recent samples kept per metric for percentiles
+SAMPLE_WINDOW_SIZE: int = 10000
+
+
+def percentile(ordered: Sequence[float], fraction: float) -> Optional[float]:
+    """Nearest-rank percentile of already sorted values (None when empty)."""
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class MetricStats:
+    """Running count/total/max plus a window of recent samples."""
+
+    __slots__ = ("count", "total", "max", "samples")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples: Deque[float] = deque(maxlen=SAMPLE_WINDOW_SIZE)
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        self.samples.append(value)
+
+    def summary(self) -> Dict[str, Any]:
+        ordered = sorted(self.samples)
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "p50": percentile(ordered, 0.5),
+            "p95": percentile(ordered, 0.95),
+            "p99": percentile(ordered, 0.99),
+            "max": self.max,
+        }
+
+
+class _NullTimer:
+    """Timer used when profiling is off or the call is not sampled."""
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *exc_info: Any) -> None:
+        return None
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ("profiler", "name", "started")
+
+    def __init__(self, profiler: "Profiler", name: str) -> None:
+        self.profiler = profiler
+        self.name = name
+        self.started = 0.0
+
+    def __enter__(self) -> None:
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.profiler.observe(self.name, time.perf_counter() - self.started)
+
+
+class Profiler:
+    """Opt-in sampling timers for hot paths.
+
+    When disabled, timer() returns a shared no-op context manager, so the
+    instrumented code pays only for one attribute check.
+    """
+
+    def __init__(self, enabled: bool = False, sample_rate: float = DEFAULT_SAMPLE_RATE) -> None:
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self._metrics: Dict[str, MetricStats] = {}
+        self._started_at = time.time()
+        self._lock = threading.Lock()
+
+    def timer(self, name: str) -> Any:
+        """Context manager recording elapsed seconds for a sampled share of calls."""
+        if not self.enabled or random.random() >= self.sample_rate:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def observe(self, name: str, value: float) -> None:
+        """Record a value (seconds for timers, counts for gauges such as queue length)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = MetricStats()
+            metric.add(value)
+
+    def report(self) -> Dict[str, Any]:
+        """Return summary of all metrics."""
+        with self._lock:
+            metrics = {name: metric.summary() for name, metric in self._metrics.items()}
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "since": self._started_at,
+            "metrics": metrics,
+        }
+
+    def reset(self) -> None:
+        """Discard collected metrics."""
+        with self._lock:
+            self._metrics.clear()
+            self._started_at = time.time()
+
+
+profiler = Profiler(
+    enabled=os.getenv("PROFILING", "").lower() in ("1", "true", "on"),
+    sample_rate=float(os.getenv("PROFILING_SAMPLE_RATE", DEFAULT_SAMPLE_RATE)),
+)
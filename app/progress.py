@@ -2,7 +2,18 @@ from __future__ import annotations
 
 import queue
 import threading
-from typing import Dict, List, Optional, Set
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Set, Tuple, Union
+
+from sqlite_state import SqliteDatabase, get_state_backend, get_state_db_path
+
+# How often SQLite listeners look for new events
+SQLITE_POLL_SECONDS: float = 0.2
+# Events older than this are pruned
+SQLITE_EVENT_RETENTION_SECONDS: int = 3600
+# Minimum seconds between prunes, which piggyback on session close
+SQLITE_PRUNE_INTERVAL_SECONDS: float = 60.0
 
 
 class ProgressStream:
@@ -54,4 +65,122 @@ class ProgressStream:
             listener.put(None)
 
 
-progress_stream = ProgressStream()
+class SqliteProgressListener:
+    """Listener that polls the shared event table for new session messages."""
+
+    def __init__(self, db: SqliteDatabase, session_id: str, last_id: int, closed: bool) -> None:
+        self._db = db
+        self._session_id = session_id
+        self._last_id = last_id
+        self._pending: Deque[Optional[str]] = deque()
+        if closed:
+            self._pending.append(None)
+
+    def _fetch(self) -> None:
+        with self._db.connection() as conn:
+            rows = conn.execute(
+                "SELECT id, message FROM progress_events"
+                " WHERE session_id = ? AND id > ? ORDER BY id",
+                (self._session_id, self._last_id),
+            ).fetchall()
+        for event_id, message in rows:
+            self._last_id = event_id
+            self._pending.append(message)
+
+    def get(self, block: bool = True, timeout: Optional[float] = None) -> Optional[str]:
+        """Return the next message, waiting like queue.Queue.get."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if not self._pending:
+                self._fetch()
+            if self._pending:
+                return self._pending.popleft()
+            if not block or (deadline is not None and time.monotonic() >= deadline):
+                raise queue.Empty
+            wait = SQLITE_POLL_SECONDS
+            if deadline is not None:
+                wait = min(wait, max(0.0, deadline - time.monotonic()))
+            time.sleep(wait)
+
+
+class SqliteProgressStream:
+    """Progress stream shared between processes through SQLite.
+
+    Messages are appended to an event table; listeners on any process poll
+    for rows newer than the last one they have seen. A NULL message marks
+    the session as closed.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS progress_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id TEXT NOT NULL,
+        message TEXT,
+        created_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS progress_events_session
+        ON progress_events (session_id, id);
+    CREATE INDEX IF NOT EXISTS progress_events_created_at
+        ON progress_events (created_at);
+    """
+
+    def __init__(self, path: str) -> None:
+        self._db = SqliteDatabase(path, self.SCHEMA)
+        self._last_prune = 0.0
+        self._prune_lock = threading.Lock()
+
+    def register(self, session_id: str) -> SqliteProgressListener:
+        """Register a new listener for the given session."""
+        with self._db.connection() as conn:
+            row: Optional[Tuple[int, Optional[str]]] = conn.execute(
+                "SELECT id, message FROM progress_events"
+                " WHERE session_id = ? ORDER BY id DESC LIMIT 1",
+                (session_id,),
+            ).fetchone()
+        if row is None:
+            return SqliteProgressListener(self._db, session_id, 0, False)
+        # Only messages published after registration are delivered, as with the in-memory stream
+        return SqliteProgressListener(self._db, session_id, row[0], row[1] is None)
+
+    def unregister(self, session_id: str, listener_queue: SqliteProgressListener) -> None:
+        """Remove a listener (listeners hold no shared state, nothing to do)."""
+
+    def publish(self, session_id: str, message: str) -> None:
+        """Publish a message to all listeners of the session."""
+        with self._db.connection() as conn:
+            conn.execute(
+                "INSERT INTO progress_events (session_id, message, created_at) VALUES (?, ?, ?)",
+                (session_id, message, time.time()),
+            )
+
+    def close(self, session_id: str) -> None:
+        """Signal completion to all listeners of the session."""
+        now = time.time()
+        with self._db.connection() as conn:
+            conn.execute(
+                "INSERT INTO progress_events (session_id, message, created_at) VALUES (?, NULL, ?)",
+                (session_id, now),
+            )
+        self._prune(now)
+
+    def _prune(self, now: float) -> None:
+        """Delete expired events, at most once per prune interval."""
+        with self._prune_lock:
+            if now - self._last_prune < SQLITE_PRUNE_INTERVAL_SECONDS:
+                return
+            self._last_prune = now
+        with self._db.connection() as conn:
+            conn.execute(
+                "DELETE FROM progress_events WHERE created_at < ?",
+                (now - SQLITE_EVENT_RETENTION_SECONDS,),
+            )
+
+
+def create_progress_stream() -> Union[ProgressStream, SqliteProgressStream]:
+    """Create progress stream for the configured state backend."""
+    if get_state_backend() == "sqlite":
+        return SqliteProgressStream(get_state_db_path())
+    return ProgressStream()
+
+
+progress_stream = create_progress_stream()
@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import itertools
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from profiling import percentile
+
+DEFAULT_MAX_CONCURRENT_JOBS: int = 2
+# Cost seconds a waiting job is credited per second spent in the queue
+DEFAULT_AGING_RATE: float = 1.0
+# Used when no metadata was extracted before the download request
+DEFAULT_JOB_COST_SECONDS: float = 60.0
+# Jobs estimated below this are reported separately in the wait statistics
+SMALL_JOB_COST_SECONDS: float = 30.0
+
+ASSUMED_THROUGHPUT_BYTES_PER_SECOND: float = 5 * 1024 * 1024
+# Fallback bitrate when the size is unknown but the duration is
+ASSUMED_VIDEO_BYTES_PER_SECOND: float = 2 * 1024 * 1024 / 8
+# Seconds of audio ffmpeg encodes to mp3 per wall clock second
+ASSUMED_TRANSCODE_SPEED: float = 50.0
+
+WAIT_HISTORY_SIZE: int = 1000
+WAIT_POLL_SECONDS: float = 1.0
+
+
+def estimate_job_cost(media_info: Optional[Dict[str, Any]], format_type: str) -> float:
+    """Estimate job run time in seconds from preflight metadata"""
+    if not media_info:
+        return DEFAULT_JOB_COST_SECONDS
+
+    duration = media_info.get("duration") or 0
+    estimated_size = media_info.get("estimated_size") or {}
+    size = estimated_size.get("audio" if format_type == "audio" else "video")
+    if not size and duration:
+        size = duration * ASSUMED_VIDEO_BYTES_PER_SECOND
+    if not size:
+        return DEFAULT_JOB_COST_SECONDS
+
+    cost = size / ASSUMED_THROUGHPUT_BYTES_PER_SECOND
+    if format_type == "audio":
+        cost += duration / ASSUMED_TRANSCODE_SPEED
+    return float(cost)
+
+
+class Ticket:
+    """A job waiting for or holding a download slot."""
+
+    __slots__ = ("client_id", "cost", "enqueued_at", "seq")
+
+    def __init__(self, client_id: str, cost: float, seq: int) -> None:
+        self.client_id = client_id
+        self.cost = cost
+        self.enqueued_at = time.monotonic()
+        self.seq = seq
+
+
+class JobScheduler:
+    """Limits concurrent downloads and orders waiting jobs.
+
+    Clients take turns: a free slot goes to a job of the client with the
+    fewest jobs running or queued ahead of it (fair share), and within a turn
+    to the shortest estimated job (SJF). Waiting time is credited against the
+    estimate so large jobs are not starved.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = DEFAULT_MAX_CONCURRENT_JOBS,
+        aging_rate: float = DEFAULT_AGING_RATE,
+    ) -> None:
+        self.max_concurrent = max_concurrent
+        self.aging_rate = aging_rate
+        self._waiting: List[Ticket] = []
+        self._running: Dict[str, int] = {}
+        self._active = 0
+        self._seq = itertools.count()
+        # (estimated cost, seconds waited) of recently started jobs
+        self._wait_history: Deque[Tuple[float, float]] = deque(maxlen=WAIT_HISTORY_SIZE)
+        self._cond = threading.Condition()
+
+    def _ranked(self, now: float) -> List[Ticket]:
+        """Waiting tickets in the order they would be started (caller must hold the lock)."""
+        aged_cost = {
+            t.seq: t.cost - self.aging_rate * (now - t.enqueued_at) for t in self._waiting
+        }
+        # A client's n-th waiting job (by aged cost) competes in round n plus its running count
+        rounds: Dict[int, int] = {}
+        queued: Dict[str, int] = {}
+        for ticket in sorted(self._waiting, key=lambda t: (aged_cost[t.seq], t.seq)):
+            position = queued.get(ticket.client_id, 0)
+            queued[ticket.client_id] = position + 1
+            rounds[ticket.seq] = self._running.get(ticket.client_id, 0) + position
+        return sorted(
+            self._waiting, key=lambda t: (rounds[t.seq], aged_cost[t.seq], t.seq)
+        )
+
+    def acquire(
+        self,
+        client_id: str,
+        cost: float,
+        on_wait: Optional[Callable[[int], None]] = None,
+        check_cancelled: Optional[Callable[[], None]] = None,
+    ) -> Ticket:
+        """Block until the job may start; on_wait receives the 1-based queue position when it changes.
+
+        check_cancelled is called on every poll and may raise to leave the queue.
+        """
+        ticket = Ticket(client_id, cost, next(self._seq))
+        last_position = 0
+        with self._cond:
+            self._waiting.append(ticket)
+        try:
+            while True:
+                if check_cancelled:
+                    check_cancelled()
+                report: Optional[int] = None
+                with self._cond:
+                    ranked = self._ranked(time.monotonic())
+                    position = ranked.index(ticket) + 1
+                    if self._active < self.max_concurrent and position == 1:
+                        self._waiting.remove(ticket)
+                        self._active += 1
+                        self._running[client_id] = self._running.get(client_id, 0) + 1
+                        self._wait_history.append(
+                            (cost, time.monotonic() - ticket.enqueued_at)
+                        )
+                        # Another slot may still be free for the next ticket
+                        self._cond.notify_all()
+                        return ticket
+                    if on_wait and position != last_position:
+                        last_position = position
+                        report = position
+                    else:
+                        # Timed wait so the position report follows aging
+                        self._cond.wait(WAIT_POLL_SECONDS)
+                # Reported without the lock: on_wait may write to a slow status store
+                if report is not None and on_wait:
+                    on_wait(report)
+        except BaseException:
+            with self._cond:
+                self._waiting.remove(ticket)
+                self._cond.notify_all()
+            raise
+
+    def release(self, ticket: Ticket) -> None:
+        """Free the slot held by ticket."""
+        with self._cond:
+            self._active -= 1
+            remaining = self._running.get(ticket.client_id, 0) - 1
+            if remaining > 0:
+                self._running[ticket.client_id] = remaining
+            else:
+                self._running.pop(ticket.client_id, None)
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return queue length and wait time percentiles."""
+        with self._cond:
+            history = list(self._wait_history)
+            stats: Dict[str, Any] = {
+                "max_concurrent": self.max_concurrent,
+                "running": self._active,
+                "waiting": len(self._waiting),
+                "clients": len(self._running),
+            }
+
+        def summarize(waits: List[float]) -> Dict[str, Any]:
+            ordered = sorted(waits)
+
+            def seconds(value: Optional[float]) -> Optional[float]:
+                return round(value, 3) if value is not None else None
+
+            return {
+                "count": len(ordered),
+                "p50": seconds(percentile(ordered, 0.5)),
+                "p95": seconds(percentile(ordered, 0.95)),
+                "max": seconds(ordered[-1] if ordered else None),
+            }
+
+        stats["wait_seconds"] = summarize([w for _, w in history])
+        stats["wait_seconds_small_jobs"] = summarize(
+            [w for c, w in history if c < SMALL_JOB_COST_SECONDS]
+        )
+        stats["wait_seconds_large_jobs"] = summarize(
+            [w for c, w in history if c >= SMALL_JOB_COST_SECONDS]
+        )
+        return stats
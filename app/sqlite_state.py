@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List
+
+# "memory" keeps state in this process, "sqlite" shares it between replicas via a database file
+DEFAULT_STATE_BACKEND: str = "memory"
+DEFAULT_STATE_DB_PATH: str = "/app/downloads/.state.sqlite3"
+SQLITE_BUSY_TIMEOUT_MS: int = 5000
+# Idle connections kept open for reuse
+SQLITE_POOL_SIZE: int = 8
+
+
+def get_state_backend() -> str:
+    """Return configured state backend name."""
+    backend = os.getenv("STATE_BACKEND", DEFAULT_STATE_BACKEND).lower()
+    if backend not in ("memory", "sqlite"):
+        raise ValueError(f"Unknown STATE_BACKEND: {backend}")
+    return backend
+
+
+def get_state_db_path() -> str:
+    """Return path of the shared state database."""
+    return os.getenv("STATE_DB_PATH", DEFAULT_STATE_DB_PATH)
+
+
+class SqliteDatabase:
+    """Small pool of connections to an SQLite database shared between processes.
+
+    Connections are handed out per use instead of per thread, since the
+    server starts a new thread for every request.
+    """
+
+    def __init__(self, path: str, schema: str, pool_size: int = SQLITE_POOL_SIZE) -> None:
+        self.path = path
+        self.pool_size = pool_size
+        self._idle: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Create tables up front so readers never race the first writer
+        with self.connection() as conn:
+            # WAL mode is stored in the database file, once is enough
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(schema)
+
+    def _connect(self) -> sqlite3.Connection:
+        # Autocommit: every statement is its own short transaction
+        conn = sqlite3.connect(
+            self.path,
+            timeout=SQLITE_BUSY_TIMEOUT_MS / 1000,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection for the duration of the block."""
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = self._connect()
+        try:
+            yield conn
+        finally:
+            with self._lock:
+                if len(self._idle) < self.pool_size:
+                    self._idle.append(conn)
+                    conn = None
+            if conn is not None:
+                conn.close()
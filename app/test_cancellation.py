@@ -0,0 +1,51 @@
+import time
+import unittest
+
+from cancellation import CancelToken, CancellationRegistry
+from exceptions import JobTimeoutError
+
+
+class TestCancelToken(unittest.TestCase):
+    """Phase deadlines of CancelToken"""
+
+    def test_progress_moves_inactivity_deadline(self):
+        """In the download phase the deadline counts from the last progress"""
+        token = CancelToken("job", {"download": 60})
+        token.enter_phase("download")
+        first_deadline = token.deadline
+        time.sleep(0.01)
+        token.touch()
+
+        self.assertGreater(token.deadline, first_deadline)
+
+    def test_progress_does_not_extend_fixed_deadline(self):
+        """The extract phase keeps its deadline from the phase start"""
+        token = CancelToken("job", {"extract": 60})
+        token.enter_phase("extract")
+        deadline = token.deadline
+        token.touch()
+
+        self.assertEqual(token.deadline, deadline)
+
+    def test_disabled_timeout_has_no_deadline(self):
+        """A timeout of 0 leaves the phase without a deadline"""
+        token = CancelToken("job", {"queue": 0, "download": 0})
+        token.enter_phase("queue")
+        self.assertIsNone(token.deadline)
+        token.enter_phase("download")
+        token.touch()
+        self.assertIsNone(token.deadline)
+
+    def test_stalled_phase_times_out(self):
+        """Without progress past the deadline the job is cancelled as timed out"""
+        token = CancelToken("job", {"download": 60})
+        token.enter_phase("download")
+        CancellationRegistry()._check(token, token.deadline + 1)
+
+        self.assertTrue(token.cancelled)
+        with self.assertRaises(JobTimeoutError):
+            token.raise_if_cancelled()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,3 +1,4 @@
+import threading
 import time
 import requests
 import unittest
@@ -111,6 +112,35 @@ class TestIntegration(unittest.TestCase):
 
         print(f"Audio test passed. Downloaded: {clean_filename}")
 
+    def test_should_stream_audio_format_as_chunked_mp3(self):
+        """Test 2b: Streamed audio arrives chunked with mp3 extension"""
+        url = "https://www.youtube.com/watch?v=bjmBJ1Fl0cs"
+
+        # Send download request in streaming mode
+        response = requests.post(
+            f"{self.BASE_URL}/download",
+            data={"url": url, "format": "audio", "stream": "1"},
+            timeout=120,
+            stream=True,
+        )
+
+        # Confirm response is successful and has no fixed length
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Content-Length", response.headers)
+
+        filename = self._extract_filename_from_content_disposition(
+            response.headers.get("Content-Disposition", "")
+        )
+        self.assertTrue(
+            filename.strip("'\" ").endswith(".mp3"),
+            f"Filename '{filename}' does not have .mp3 extension",
+        )
+
+        # Confirm that response body contains file data
+        self.assertGreater(len(response.content), 0)
+
+        print(f"Audio streaming test passed. Downloaded: {filename}")
+
     def test_should_download_twitter_video_with_correct_extension(self):
         """Test 3: Download Twitter video in video format with appropriate extension"""
         url = "https://x.com/trorez/status/1280440336855138304?s=46&t=ELSr1I78F3BnPuHrFtlWPQ"
@@ -175,6 +205,99 @@ class TestIntegration(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json(), {"status": "ok"})
 
+    def test_info_returns_metadata_without_downloading(self):
+        """Confirm that info endpoint returns compact metadata for a video"""
+        url = "https://youtu.be/bjmBJ1Fl0cs"
+
+        response = requests.get(f"{self.BASE_URL}/info", params={"url": url}, timeout=60)
+
+        self.assertEqual(response.status_code, 200)
+        info = response.json()
+        self.assertIn("著作権フリーサンプル動画 1", info["title"])
+        self.assertEqual(info["platform"], "youtube")
+        self.assertEqual(info["media_id"], "bjmBJ1Fl0cs")
+        self.assertGreater(info["duration"], 0)
+        self.assertIn("thumbnail", info)
+        self.assertIn("video", info["estimated_size"])
+        self.assertIn("audio", info["estimated_size"])
+
+        # Repeat query for another URL form is answered from the cache
+        response = requests.get(
+            f"{self.BASE_URL}/info",
+            params={"url": "https://www.youtube.com/watch?v=bjmBJ1Fl0cs"},
+            timeout=5,
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["title"], info["title"])
+
+    def test_info_without_url_returns_error(self):
+        """Confirm that info endpoint rejects missing URL"""
+        response = requests.get(f"{self.BASE_URL}/info")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("error", response.json())
+
+    def test_storage_reports_usage_and_evictions(self):
+        """Confirm that storage endpoint reports disk usage and eviction counts"""
+        response = requests.get(f"{self.BASE_URL}/storage")
+        self.assertEqual(response.status_code, 200)
+        stats = response.json()
+        for key in ("used_bytes", "tracked_files", "evicted_files", "evicted_bytes"):
+            self.assertIn(key, stats)
+        self.assertGreaterEqual(stats["used_bytes"], 0)
+
+    def test_queue_reports_wait_times(self):
+        """Confirm that queue endpoint reports scheduler state and wait times"""
+        response = requests.get(f"{self.BASE_URL}/queue")
+        self.assertEqual(response.status_code, 200)
+        stats = response.json()
+        for key in ("max_concurrent", "running", "waiting", "wait_seconds"):
+            self.assertIn(key, stats)
+        self.assertIn("p50", stats["wait_seconds"])
+
+    def test_cancel_unknown_job_returns_not_found(self):
+        """Confirm that cancelling an unknown job returns 404"""
+        response = requests.delete(f"{self.BASE_URL}/jobs/no-such-job")
+        self.assertEqual(response.status_code, 404)
+
+    def test_cancel_running_download(self):
+        """Confirm that a running download can be cancelled via DELETE /jobs/<id>"""
+        session_id = f"cancel-test-{time.time()}"
+        result = {}
+
+        def run_download():
+            # Long 4K source (about 10 minutes) that cannot finish before the cancel arrives;
+            # cancelled downloads are never stored, so it is not served from a previous run
+            result["response"] = requests.post(
+                f"{self.BASE_URL}/download",
+                data={
+                    "url": "https://www.youtube.com/watch?v=aqz-KE-bpKQ",
+                    "format": "video",
+                    "session_id": session_id,
+                },
+                timeout=120,
+            )
+
+        thread = threading.Thread(target=run_download)
+        thread.start()
+
+        # Wait until the job is known, then cancel it
+        for _ in range(50):
+            status = requests.get(f"{self.BASE_URL}/jobs/{session_id}/status")
+            if status.status_code == 200:
+                break
+            time.sleep(0.1)
+        response = requests.delete(f"{self.BASE_URL}/jobs/{session_id}")
+        thread.join()
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(result["response"].status_code, 409)
+        status = requests.get(f"{self.BASE_URL}/jobs/{session_id}/status").json()
+        self.assertEqual(status["status"], "cancelled")
+
+        # The job has ended, so a second cancel is rejected
+        response = requests.delete(f"{self.BASE_URL}/jobs/{session_id}")
+        self.assertEqual(response.status_code, 409)
+
     def test_invalid_url_returns_error(self):
         """Confirm that error is returned for invalid URL"""
         response = requests.post(
@@ -0,0 +1,120 @@
+import os
+import tempfile
+import time
+import unittest
+
+from janitor import DownloadJanitor
+
+
+class TestDownloadJanitor(unittest.TestCase):
+    """Eviction passes of DownloadJanitor on a temporary directory"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root_dir = self.temp_dir.name
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _create_file(self, name, size=10, age_seconds=0):
+        path = os.path.join(self.root_dir, name)
+        with open(path, "wb") as f:
+            f.write(b"x" * size)
+        if age_seconds:
+            mtime = time.time() - age_seconds
+            os.utime(path, (mtime, mtime))
+        return path
+
+    def test_quota_evicts_least_recently_served_first(self):
+        """Files are evicted in serve order until usage fits the quota"""
+        janitor = DownloadJanitor(self.root_dir, quota_bytes=15)
+        a, b, c = (self._create_file(name) for name in ("a", "b", "c"))
+        for path in (a, b, c):
+            janitor.track(path)
+        # Serving a again makes b the least recently served
+        janitor.track(a)
+
+        self.assertEqual(janitor.run_once(), 2)
+
+        self.assertTrue(os.path.exists(a))
+        self.assertFalse(os.path.exists(b))
+        self.assertFalse(os.path.exists(c))
+        stats = janitor.stats()
+        self.assertEqual(stats["used_bytes"], 10)
+        self.assertEqual(stats["evicted_files"], 2)
+        self.assertEqual(stats["evicted_bytes"], 20)
+
+    def test_max_age_evicts_only_expired_files(self):
+        """Files not served within max age are evicted, recent ones are kept"""
+        old = self._create_file("old", age_seconds=120)
+        new = self._create_file("new")
+        janitor = DownloadJanitor(self.root_dir, max_age_seconds=60)
+        janitor.load_existing()
+
+        self.assertEqual(janitor.run_once(), 1)
+
+        self.assertFalse(os.path.exists(old))
+        self.assertTrue(os.path.exists(new))
+
+    def test_hidden_entries_are_not_indexed(self):
+        """Internal bookkeeping files are never tracked"""
+        self._create_file(".media_index.json")
+        self._create_file("video.mp4")
+        janitor = DownloadJanitor(self.root_dir)
+        janitor.load_existing()
+
+        self.assertEqual(janitor.stats()["tracked_files"], 1)
+
+    def test_file_in_use_is_not_evicted_until_released(self):
+        """A file being served is skipped and evicted on a later pass"""
+        janitor = DownloadJanitor(self.root_dir, quota_bytes=5)
+        path = self._create_file("serving")
+        janitor.track(path, acquire=True)
+
+        self.assertEqual(janitor.run_once(), 0)
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(janitor.stats()["in_use_files"], 1)
+
+        janitor.release(path)
+        self.assertEqual(janitor.run_once(), 1)
+        self.assertFalse(os.path.exists(path))
+
+    def test_failed_removal_keeps_file_in_index(self):
+        """A file that could not be removed stays tracked and counted"""
+
+        def remove_file(path):
+            raise PermissionError(path)
+
+        janitor = DownloadJanitor(self.root_dir, quota_bytes=15, remove_file=remove_file)
+        a, b = self._create_file("a"), self._create_file("b")
+        janitor.track(a)
+        janitor.track(b)
+
+        self.assertEqual(janitor.run_once(), 0)
+
+        stats = janitor.stats()
+        self.assertEqual(stats["tracked_files"], 2)
+        self.assertEqual(stats["used_bytes"], 20)
+        self.assertEqual(stats["evicted_files"], 0)
+        # Still the eviction candidate on the next pass
+        janitor._remove_file = os.remove
+        self.assertEqual(janitor.run_once(), 1)
+        self.assertFalse(os.path.exists(a))
+        self.assertTrue(os.path.exists(b))
+
+    def test_file_already_gone_leaves_index(self):
+        """A file removed behind the janitor's back is dropped from the index"""
+        janitor = DownloadJanitor(self.root_dir, quota_bytes=5)
+        path = self._create_file("gone")
+        janitor.track(path)
+        os.remove(path)
+
+        self.assertEqual(janitor.run_once(), 0)
+
+        stats = janitor.stats()
+        self.assertEqual(stats["tracked_files"], 0)
+        self.assertEqual(stats["used_bytes"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import os
+import tempfile
+import time
+import unittest
+
+import media_store
+from media_store import MediaStore
+
+
+class TestMediaStore(unittest.TestCase):
+    """Content-addressed storage on a temporary download directory"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root_dir = self.temp_dir.name
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _write(self, path, data):
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def _stage(self, store, data):
+        return self._write(os.path.join(store.staging_dir, "download.part"), data)
+
+    def test_identical_content_shares_one_object(self):
+        """Two media keys with the same bytes point at a single object"""
+        store = MediaStore(self.root_dir)
+        first = store.add(self._stage(store, b"same"), "Title A.mp4", "youtube:a:video")
+        second = store.add(self._stage(store, b"same"), "Title B.mp4", "twitter:1:video")
+
+        self.assertEqual(first, second)
+        self.assertEqual(os.listdir(store.objects_dir), [os.path.basename(first)])
+        self.assertEqual(store.checkout("youtube:a:video"), (first, "Title A.mp4"))
+        self.assertEqual(store.checkout("twitter:1:video"), (first, "Title B.mp4"))
+
+    def test_same_title_keeps_content_apart(self):
+        """Different media with the same title are served from different objects"""
+        store = MediaStore(self.root_dir)
+        store.add(self._stage(store, b"A"), "Same Title.mp4", "youtube:a:video")
+        store.add(self._stage(store, b"B"), "Same Title.mp4", "youtube:b:video")
+
+        path, _ = store.checkout("youtube:a:video")
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), b"A")
+
+    def test_remove_object_drops_every_key(self):
+        """Removing an object forgets all media keys that pointed at it"""
+        store = MediaStore(self.root_dir)
+        path = store.add(self._stage(store, b"same"), "a.mp4", "youtube:a:video")
+        store.add(self._stage(store, b"same"), "b.mp4", "twitter:1:video")
+
+        store.remove_object(path)
+
+        self.assertFalse(os.path.exists(path))
+        self.assertIsNone(store.checkout("youtube:a:video"))
+        self.assertIsNone(MediaStore(self.root_dir).checkout("twitter:1:video"))
+
+    def test_index_survives_restart(self):
+        """Stored media is found again by a new store instance"""
+        store = MediaStore(self.root_dir)
+        path = store.add(self._stage(store, b"data"), "a.mp3", "youtube:a:audio")
+
+        self.assertEqual(
+            MediaStore(self.root_dir).checkout("youtube:a:audio"), (path, "a.mp3")
+        )
+
+    def test_stale_staging_entries_are_removed(self):
+        """Partial downloads left by an interrupted run are cleared on startup"""
+        staging_dir = os.path.join(self.root_dir, ".staging")
+        stale_dir = os.path.join(staging_dir, "tmp-stale")
+        os.makedirs(stale_dir)
+        stale_file = self._write(os.path.join(stale_dir, "video.part"), b"x")
+        old = time.time() - media_store.STALE_STAGING_SECONDS - 60
+        os.utime(stale_file, (old, old))
+        os.utime(stale_dir, (old, old))
+        active_dir = os.path.join(staging_dir, "tmp-active")
+        os.makedirs(active_dir)
+        self._write(os.path.join(active_dir, "video.part"), b"x")
+
+        MediaStore(self.root_dir)
+
+        self.assertFalse(os.path.exists(stale_dir))
+        self.assertTrue(os.path.exists(active_dir))
+
+    def test_legacy_files_are_imported(self):
+        """Media saved in the old flat layout moves into the store"""
+        legacy = self._write(os.path.join(self.root_dir, "Old Video.mp4"), b"old")
+        report = self._write(os.path.join(self.root_dir, "bench.json"), b"{}")
+        mtime = time.time() - 3600
+        os.utime(legacy, (mtime, mtime))
+
+        store = MediaStore(self.root_dir)
+
+        self.assertFalse(os.path.exists(legacy))
+        self.assertTrue(os.path.exists(report))
+        objects = os.listdir(store.objects_dir)
+        self.assertEqual(len(objects), 1)
+        self.assertTrue(objects[0].endswith(".mp4"))
+        # Keeps its age so the janitor orders it correctly
+        stored = os.stat(os.path.join(store.objects_dir, objects[0]))
+        self.assertAlmostEqual(stored.st_mtime, mtime, delta=1)
+
+
+if __name__ == "__main__":
+    unittest.main()
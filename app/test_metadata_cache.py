@@ -0,0 +1,57 @@
+import unittest
+from unittest import mock
+
+from metadata_cache import MetadataCache
+
+
+class TestMetadataCache(unittest.TestCase):
+    """LRU and TTL behaviour of MetadataCache"""
+
+    def test_evicts_least_recently_used_entry_when_full(self):
+        """Storing beyond max_entries drops the oldest entry"""
+        cache = MetadataCache(max_entries=2)
+        cache.put("a", {"title": "A"})
+        cache.put("b", {"title": "B"})
+        cache.put("c", {"title": "C"})
+
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("b"), {"title": "B"})
+        self.assertEqual(cache.get("c"), {"title": "C"})
+
+    def test_get_refreshes_recency(self):
+        """A read entry survives eviction in favour of an unread one"""
+        cache = MetadataCache(max_entries=2)
+        cache.put("a", {"title": "A"})
+        cache.put("b", {"title": "B"})
+        self.assertEqual(cache.get("a"), {"title": "A"})
+        cache.put("c", {"title": "C"})
+
+        self.assertEqual(cache.get("a"), {"title": "A"})
+        self.assertIsNone(cache.get("b"))
+
+    def test_entries_expire_after_ttl(self):
+        """An entry is returned until the TTL passes and missing afterwards"""
+        cache = MetadataCache(ttl_seconds=60)
+        with mock.patch("metadata_cache.time.monotonic", return_value=1000.0):
+            cache.put("a", {"title": "A"})
+        with mock.patch("metadata_cache.time.monotonic", return_value=1060.0):
+            self.assertEqual(cache.get("a"), {"title": "A"})
+        with mock.patch("metadata_cache.time.monotonic", return_value=1061.0):
+            self.assertIsNone(cache.get("a"))
+        # Expired entries are dropped, not just hidden
+        self.assertEqual(len(cache._entries), 0)
+
+    def test_put_replaces_existing_entry(self):
+        """Storing a key again updates it without growing the cache"""
+        cache = MetadataCache(max_entries=2)
+        cache.put("a", {"title": "A"})
+        cache.put("b", {"title": "B"})
+        cache.put("a", {"title": "A2"})
+        cache.put("c", {"title": "C"})
+
+        self.assertEqual(cache.get("a"), {"title": "A2"})
+        self.assertIsNone(cache.get("b"))
+
+
+if __name__ == "__main__":
+    unittest.main()
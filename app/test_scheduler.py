@@ -0,0 +1,138 @@
+import threading
+import time
+import unittest
+
+from scheduler import JobScheduler
+
+
+class TestJobScheduler(unittest.TestCase):
+    """Start order of queued jobs in JobScheduler"""
+
+    def setUp(self):
+        self.started = []
+        self.threads = []
+        self.errors = []
+        self.lock = threading.Lock()
+
+    def tearDown(self):
+        for thread in self.threads:
+            thread.join(timeout=5)
+
+    def _wait_until(self, predicate, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while not predicate():
+            if time.monotonic() > deadline:
+                self.fail("Timed out waiting for the scheduler")
+            time.sleep(0.01)
+
+    def _enqueue(self, scheduler, label, client_id, cost, check_cancelled=None):
+        """Queue a job in a thread; it records its label once started and keeps the slot"""
+
+        def run():
+            try:
+                scheduler.acquire(client_id, cost, check_cancelled=check_cancelled)
+            except Exception as e:
+                with self.lock:
+                    self.errors.append((label, e))
+                return
+            with self.lock:
+                self.started.append(label)
+
+        waiting = scheduler.stats()["waiting"]
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        self.threads.append(thread)
+        self._wait_until(lambda: scheduler.stats()["waiting"] == waiting + 1)
+
+    def _start_order(self, scheduler, holders):
+        """Free the held slots one by one and return the order queued jobs started in"""
+        for count, holder in enumerate(holders, start=1):
+            scheduler.release(holder)
+            self._wait_until(lambda: len(self.started) == count)
+        return list(self.started)
+
+    def _fill_slots(self, scheduler):
+        return [scheduler.acquire("holder", 0) for _ in range(scheduler.max_concurrent)]
+
+    def test_shortest_job_starts_first(self):
+        """Within one client, jobs start in order of estimated cost"""
+        scheduler = JobScheduler(max_concurrent=3, aging_rate=0)
+        holders = self._fill_slots(scheduler)
+        self._enqueue(scheduler, "long", "a", 50)
+        self._enqueue(scheduler, "short", "a", 10)
+        self._enqueue(scheduler, "medium", "a", 30)
+
+        self.assertEqual(
+            self._start_order(scheduler, holders), ["short", "medium", "long"]
+        )
+
+    def test_clients_take_turns(self):
+        """A client with many short jobs cannot hold back another client's job"""
+        scheduler = JobScheduler(max_concurrent=4, aging_rate=0)
+        holders = self._fill_slots(scheduler)
+        self._enqueue(scheduler, "a1", "a", 10)
+        self._enqueue(scheduler, "a2", "a", 10)
+        self._enqueue(scheduler, "a3", "a", 10)
+        self._enqueue(scheduler, "b1", "b", 100)
+
+        self.assertEqual(
+            self._start_order(scheduler, holders), ["a1", "b1", "a2", "a3"]
+        )
+
+    def test_waiting_time_ages_large_jobs(self):
+        """A large job that waited long enough overtakes a newer small job"""
+        scheduler = JobScheduler(max_concurrent=2, aging_rate=1000)
+        holders = self._fill_slots(scheduler)
+        self._enqueue(scheduler, "large", "a", 100)
+        # Credited 1000 cost seconds per second waited, so 0.2s outweighs the cost difference
+        time.sleep(0.2)
+        self._enqueue(scheduler, "small", "a", 1)
+
+        self.assertEqual(self._start_order(scheduler, holders), ["large", "small"])
+
+    def test_position_is_reported_without_holding_the_lock(self):
+        """on_wait runs while other threads can still use the scheduler"""
+        scheduler = JobScheduler(max_concurrent=1, aging_rate=0)
+        holders = self._fill_slots(scheduler)
+        blocked = []
+
+        def on_wait(position):
+            # stats() needs the scheduler lock; it would hang if on_wait held it
+            probe = threading.Thread(target=scheduler.stats, daemon=True)
+            probe.start()
+            probe.join(timeout=1)
+            blocked.append(probe.is_alive())
+
+        thread = threading.Thread(
+            target=lambda: scheduler.acquire("a", 10, on_wait=on_wait), daemon=True
+        )
+        thread.start()
+        self.threads.append(thread)
+        self._wait_until(lambda: len(blocked) == 1)
+        scheduler.release(holders[0])
+        thread.join(timeout=5)
+
+        self.assertEqual(blocked, [False])
+        self.assertEqual(scheduler.stats()["running"], 1)
+
+    def test_cancelled_job_leaves_queue(self):
+        """A job whose cancel check raises is removed without taking a slot"""
+        scheduler = JobScheduler(max_concurrent=1, aging_rate=0)
+        holders = self._fill_slots(scheduler)
+        cancelled = threading.Event()
+
+        def check_cancelled():
+            if cancelled.is_set():
+                raise RuntimeError("cancelled")
+
+        self._enqueue(scheduler, "cancelled", "a", 10, check_cancelled)
+        cancelled.set()
+        self._wait_until(lambda: scheduler.stats()["waiting"] == 0)
+
+        self.assertEqual([label for label, _ in self.errors], ["cancelled"])
+        scheduler.release(holders[0])
+        self.assertEqual(scheduler.stats()["running"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import queue
+import tempfile
+import unittest
+
+from job_status import SqliteJobStatusStore
+from progress import SqliteProgressStream
+
+
+class TestSqliteState(unittest.TestCase):
+    """Two store instances sharing one database file, as two replicas would"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.temp_dir.name, "state.sqlite3")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_progress_is_shared_between_streams(self):
+        """A listener on one stream receives messages and close published on another"""
+        publisher = SqliteProgressStream(self.db_path)
+        subscriber = SqliteProgressStream(self.db_path)
+        listener = subscriber.register("job-1")
+
+        publisher.publish("job-1", "Download progress: 10%")
+        publisher.publish("job-2", "Other job")
+        publisher.publish("job-1", "Download progress: 50%")
+        publisher.close("job-1")
+
+        self.assertEqual(listener.get(timeout=1), "Download progress: 10%")
+        self.assertEqual(listener.get(timeout=1), "Download progress: 50%")
+        self.assertIsNone(listener.get(timeout=1))
+
+    def test_listener_only_receives_new_messages(self):
+        """Messages published before registration are not replayed"""
+        publisher = SqliteProgressStream(self.db_path)
+        subscriber = SqliteProgressStream(self.db_path)
+        publisher.publish("job-1", "Download started")
+        listener = subscriber.register("job-1")
+
+        with self.assertRaises(queue.Empty):
+            listener.get(timeout=0.3)
+
+    def test_register_after_close_signals_completion(self):
+        """A listener registered after the session closed completes immediately"""
+        publisher = SqliteProgressStream(self.db_path)
+        subscriber = SqliteProgressStream(self.db_path)
+        publisher.publish("job-1", "Download started")
+        publisher.close("job-1")
+
+        self.assertIsNone(subscriber.register("job-1").get(block=False))
+
+    def test_job_status_is_shared_between_stores(self):
+        """Status and cancel requests written by one store are seen by another"""
+        writer = SqliteJobStatusStore(self.db_path)
+        reader = SqliteJobStatusStore(self.db_path)
+
+        self.assertEqual(reader.get_status("job-1")["status"], "not_found")
+        writer.set_status("job-1", "in_progress", "Download progress: 10%")
+        self.assertEqual(
+            reader.get_status("job-1"),
+            {"status": "in_progress", "message": "Download progress: 10%"},
+        )
+
+        self.assertFalse(writer.is_cancel_requested("job-1"))
+        reader.request_cancel("job-1")
+        self.assertTrue(writer.is_cancel_requested("job-1"))
+
+        reader.clear("job-1")
+        self.assertEqual(writer.get_status("job-1")["status"], "not_found")
+        self.assertFalse(writer.is_cancel_requested("job-1"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+
+from video_utils import extract_media_id
+
+
+class TestExtractMediaId(unittest.TestCase):
+    """Canonical media IDs for the URL forms of one video"""
+
+    def test_youtube_url_forms_share_one_id(self):
+        """youtu.be, watch, shorts, embed and mobile URLs map to the same ID"""
+        urls = [
+            "https://youtu.be/bjmBJ1Fl0cs",
+            "https://youtu.be/bjmBJ1Fl0cs?si=abc&t=10",
+            "https://www.youtube.com/watch?v=bjmBJ1Fl0cs",
+            "https://www.youtube.com/watch?feature=share&v=bjmBJ1Fl0cs&list=PL123",
+            "https://youtube.com/shorts/bjmBJ1Fl0cs",
+            "https://www.youtube.com/embed/bjmBJ1Fl0cs",
+            "https://m.youtube.com/watch?v=bjmBJ1Fl0cs",
+            "https://music.youtube.com/watch?v=bjmBJ1Fl0cs",
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(extract_media_id(url), ("youtube", "bjmBJ1Fl0cs"))
+
+    def test_twitter_and_x_status_links_share_one_id(self):
+        """twitter.com and x.com status links map to the same ID"""
+        urls = [
+            "https://twitter.com/user/status/1234567890123456789",
+            "https://x.com/user/status/1234567890123456789",
+            "https://mobile.twitter.com/user/status/1234567890123456789?s=20",
+            "https://x.com/i/web/status/1234567890123456789",
+            "https://x.com/user/status/1234567890123456789/video/1",
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(
+                    extract_media_id(url), ("twitter", "1234567890123456789")
+                )
+
+    def test_tiktok_video_link(self):
+        """TikTok video links carry the numeric ID"""
+        self.assertEqual(
+            extract_media_id("https://www.tiktok.com/@user/video/7234567890123456789"),
+            ("tiktok", "7234567890123456789"),
+        )
+
+    def test_urls_without_stable_id_return_none(self):
+        """Pages that do not name a single video have no media ID"""
+        urls = [
+            "https://www.youtube.com/",
+            "https://www.youtube.com/watch",
+            "https://www.youtube.com/watch?v=too-short",
+            "https://www.youtube.com/@channel/videos",
+            "https://x.com/user",
+            "https://twitter.com/user/status/not-a-number",
+            "https://vm.tiktok.com/ZMabcdef/",
+            "https://example.com/watch?v=bjmBJ1Fl0cs",
+            "https://notyoutube.com/watch?v=bjmBJ1Fl0cs",
+            "not a url",
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertIsNone(extract_media_id(url))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,4 +1,5 @@
-from typing import Iterable, Optional
+from typing import Iterable, List, Optional, Tuple
+import re
 from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
 
 
@@ -7,6 +8,11 @@ YOUTUBE_EXACT_HOSTS = ("youtu.be",)
 TWITTER_BASE_DOMAINS = ("twitter.com", "x.com")
 TIKTOK_BASE_DOMAINS = ("tiktok.com",)
 
+# Path prefixes that are followed directly by a YouTube video ID
+YOUTUBE_ID_PATH_PREFIXES = ("shorts", "embed", "live", "v")
+YOUTUBE_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{11}$")
+NUMERIC_ID_PATTERN = re.compile(r"^[0-9]+$")
+
 
 def _normalize_hostname(hostname: Optional[str]) -> str:
     """Normalize hostname for comparison (lowercase, trim trailing dot)."""
@@ -67,3 +73,55 @@ def clean_video_url(url: str) -> str:
 
     # Twitter/X URLs - return as-is
     return url
+
+
+def _path_segments(path: str) -> List[str]:
+    """Split URL path into non-empty segments."""
+    return [segment for segment in path.split("/") if segment]
+
+
+def _extract_youtube_id(hostname: str, path: str, query: str) -> Optional[str]:
+    """Extract video ID from youtu.be, watch, shorts, embed and live URLs."""
+    segments = _path_segments(path)
+    candidate: Optional[str] = None
+    if hostname in YOUTUBE_EXACT_HOSTS:
+        candidate = segments[0] if segments else None
+    elif segments and segments[0] == "watch":
+        candidate = parse_qs(query).get("v", [None])[0]
+    elif len(segments) >= 2 and segments[0] in YOUTUBE_ID_PATH_PREFIXES:
+        candidate = segments[1]
+    if candidate and YOUTUBE_ID_PATTERN.match(candidate):
+        return candidate
+    return None
+
+
+def _extract_following_numeric_id(path: str, markers: Iterable[str]) -> Optional[str]:
+    """Return the numeric path segment that follows one of the marker segments."""
+    segments = _path_segments(path)
+    for i, segment in enumerate(segments[:-1]):
+        if segment in markers and NUMERIC_ID_PATTERN.match(segments[i + 1]):
+            return segments[i + 1]
+    return None
+
+
+def extract_media_id(url: str) -> Optional[Tuple[str, str]]:
+    """Extract canonical (platform, media_id) from video URL (None when the URL has no stable ID)"""
+    parsed = urlparse(url)
+    hostname = _normalize_hostname(parsed.hostname)
+
+    # youtu.be/ID, youtube.com/watch?v=ID, /shorts/ID, /embed/ID, /live/ID (including m. and music. hosts)
+    if _hostname_matches(hostname, YOUTUBE_BASE_DOMAINS, YOUTUBE_EXACT_HOSTS):
+        video_id = _extract_youtube_id(hostname, parsed.path, parsed.query)
+        return ("youtube", video_id) if video_id else None
+
+    # twitter.com/x.com /<user>/status/ID, /i/status/ID, /i/web/status/ID
+    if _hostname_matches(hostname, TWITTER_BASE_DOMAINS):
+        status_id = _extract_following_numeric_id(parsed.path, ("status", "statuses"))
+        return ("twitter", status_id) if status_id else None
+
+    # tiktok.com/@user/video/ID (short links like vm.tiktok.com carry no ID)
+    if _hostname_matches(hostname, TIKTOK_BASE_DOMAINS):
+        video_id = _extract_following_numeric_id(parsed.path, ("video",))
+        return ("tiktok", video_id) if video_id else None
+
+    return None
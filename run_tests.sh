@@ -14,6 +14,10 @@ else
     echo "Application is already running"
 fi
 
+# Run unit tests inside container
+echo "Running unit tests inside container..."
+docker compose exec nablazy-app python3 -m unittest test_janitor test_scheduler test_sqlite_state test_video_utils test_media_store test_metadata_cache test_cancellation -v
+
 # Run integration tests inside container
 echo "Running integration tests inside container..."
 docker compose exec nablazy-app python3 -m unittest test_integration -v